@@ -3,13 +3,254 @@ Google Gemini API integration for AI-powered vision analysis
 Handles image analysis and navigation decision making
 """
 
-import google.generativeai as genai
 from PIL import Image
+import cv2
+import numpy as np
+import hashlib
+import io
 import logging
 import time
 import re
-from typing import Optional, Dict, Tuple
-from config import GEMINI_API_KEY, GEMINI_MODEL, AI_PROMPT, validate_api_key
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Optional, Dict, List, Tuple, Union
+from config import (
+    GEMINI_API_KEY, GEMINI_MODEL, AI_PROMPT, validate_api_key,
+    AI_RATE_LIMIT_CAPACITY, AI_RATE_LIMIT_REFILL_RATE, AI_CACHE_SIZE, AI_CACHE_TTL,
+    AI_HASH_MIN_CONTRAST,
+    AI_BATCH_SIZE, AI_IMAGE_MAX_SIZE, AI_JPEG_QUALITY, AI_REQUEST_TIMEOUT,
+    AI_CIRCUIT_FAIL_THRESHOLD, AI_CIRCUIT_COOLDOWN
+)
+from camera_module import shrink_frame
+
+# Frames are OpenCV BGR arrays from the camera; PIL Images and already encoded
+# JPEG bytes (raw MJPEG capture) are also accepted
+ImageInput = Union[np.ndarray, Image.Image, bytes]
+
+# JPEG encoder parameters, built once and reused for every frame
+_JPEG_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), AI_JPEG_QUALITY]
+
+# Upper bound on images sent in one request (well under Gemini's per-request limit)
+MAX_IMAGES_PER_REQUEST = 16
+
+# Appended to the prompt when several frames are sent together
+_BATCH_PROMPT_SUFFIX = """
+You are given {n} consecutive frames from the camera, oldest first.
+Return {n} blocks, one per frame in the same order, each starting with "FRAME i:" followed by
+ACTION: [command] REASON: [explanation]
+"""
+
+# Prompt for get_safety_analysis, shared so repeated scans hit the analysis cache
+_SAFETY_PROMPT = """
+Analyze this image for safety concerns for a humanoid robot:
+
+1. Are there any people or animals in the scene?
+2. Are there any dangerous obstacles (stairs, holes, fragile objects)?
+3. Is the ground stable and safe for walking?
+4. Are there any moving objects or vehicles?
+
+Respond with:
+SAFETY: SAFE/CAUTION/DANGER
+CONCERNS: [list any safety concerns]
+RECOMMENDATION: [safety recommendation]
+"""
+
+@dataclass
+class Decision:
+    """Navigation decision parsed from a Gemini response"""
+    # Declared by hand, dataclass(slots=True) needs Python 3.10
+    __slots__ = ('action', 'reason', 'raw_response', 'confidence', 'timestamp')
+    
+    action: str
+    reason: str
+    raw_response: str
+    confidence: float
+    timestamp: float
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Decision':
+        """
+        Build a decision from a legacy decision dictionary
+        
+        Args:
+            data: Dictionary with action/reason/confidence keys
+            
+        Returns:
+            Decision: Decision with safe defaults for missing keys
+        """
+        return cls(
+            action=data.get('action', 'stop'),
+            reason=data.get('reason', 'No reason provided'),
+            raw_response=data.get('raw_response', ''),
+            confidence=data.get('confidence', 0.0),
+            timestamp=data.get('timestamp', time.time())
+        )
+
+def perceptual_hash(image: ImageInput) -> int:
+    """
+    Compute a 64-bit average hash of an image
+    Near-identical frames (stationary robot, same scene) map to the same value
+    
+    Args:
+        image: OpenCV frame (BGR or grayscale), PIL Image or JPEG bytes to hash
+        
+    Returns:
+        int: 64-bit perceptual hash, 0 for frames without usable texture
+             (covered lens, darkness, plain wall), which are never cached
+    """
+    if isinstance(image, bytes):
+        # Reduced decode only computes 1/8 scale grayscale DCT output
+        image = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    
+    if isinstance(image, np.ndarray):
+        small = cv2.resize(image, (8, 8), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    else:
+        small = np.asarray(image.resize((8, 8), Image.BILINEAR).convert('L'))
+    
+    # Low-texture frames would all share a few hashes whatever the scene
+    if small.std() < AI_HASH_MIN_CONTRAST:
+        return 0
+    bits = small > small.mean()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+# Precompiled response parsing patterns
+_ACTION_RE = re.compile(r'ACTION:\s*(\w+)', re.IGNORECASE)
+_REASON_RE = re.compile(r'REASON:\s*(.+?)(?:\n|$)', re.IGNORECASE)
+_FALLBACK_RE = re.compile(
+    r'\b(move_forward|forward|turn_left|left|turn_right|right|move_backward|backward|stop)\b',
+    re.IGNORECASE
+)
+_FALLBACK_ACTIONS = {
+    'move_forward': 'move_forward',
+    'forward': 'move_forward',
+    'turn_left': 'turn_left',
+    'left': 'turn_left',
+    'turn_right': 'turn_right',
+    'right': 'turn_right',
+    'move_backward': 'move_backward',
+    'backward': 'move_backward',
+    'stop': 'stop'
+}
+_FRAME_SPLIT_RE = re.compile(r'FRAME\s*(\d+)\s*:', re.IGNORECASE)
+_UNCERTAIN_RE = re.compile(r'\b(?:maybe|might|possibly|unclear|uncertain)\b', re.IGNORECASE)
+
+def _shrink_image(image: ImageInput) -> ImageInput:
+    """
+    Downscale an image so its longest side fits AI_IMAGE_MAX_SIZE
+    
+    Args:
+        image: OpenCV frame (BGR), PIL Image or JPEG bytes to shrink
+        
+    Returns:
+        Downscaled copy, or the original image if already small enough
+        (JPEG bytes are passed through rather than re-encoded)
+    """
+    if isinstance(image, bytes):
+        return image
+    
+    if isinstance(image, np.ndarray):
+        return shrink_frame(image)
+    
+    if max(image.size) <= AI_IMAGE_MAX_SIZE:
+        return image
+    
+    small = image.copy()
+    small.thumbnail((AI_IMAGE_MAX_SIZE, AI_IMAGE_MAX_SIZE), Image.BILINEAR)
+    return small
+
+def _jpeg_blob(image: ImageInput) -> Dict:
+    """
+    Encode an image as an inline JPEG blob for generate_content
+    OpenCV frames are encoded directly from BGR without a PIL round-trip
+    
+    Args:
+        image: OpenCV frame (BGR), PIL Image or JPEG bytes to encode
+        
+    Returns:
+        dict: Blob with mime_type and JPEG data
+    """
+    if isinstance(image, bytes):
+        return {'mime_type': 'image/jpeg', 'data': image}
+    
+    if isinstance(image, np.ndarray):
+        ok, jpg = cv2.imencode('.jpg', image, _JPEG_PARAMS)
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        # The SDK only accepts bytes, so this single copy out of the encoder
+        # buffer is the minimum (staging through a reusable bytearray adds one)
+        return {'mime_type': 'image/jpeg', 'data': jpg.tobytes()}
+    
+    # PIL fallback (test harness)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=AI_JPEG_QUALITY, optimize=False)
+    return {'mime_type': 'image/jpeg', 'data': buffer.getvalue()}
+
+@lru_cache(maxsize=32)
+def _prompt_digest(prompt: str) -> bytes:
+    """Short digest of a prompt for use in cache keys"""
+    return hashlib.blake2b(prompt.encode(), digest_size=8).digest()
+
+class TokenBucket:
+    """
+    Non-blocking token bucket rate limiter
+    Allows short bursts up to capacity while keeping the long-run
+    request rate at refill_rate tokens per second
+    """
+    
+    def __init__(self, capacity: float = AI_RATE_LIMIT_CAPACITY,
+                 refill_rate: float = AI_RATE_LIMIT_REFILL_RATE):
+        """
+        Initialize token bucket (starts full)
+        
+        Args:
+            capacity: Maximum number of tokens (burst size)
+            refill_rate: Tokens added per second
+        """
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic_ns()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        """Add tokens accumulated since the last refill"""
+        now = time.monotonic_ns()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate / 1e9)
+        self.last_refill = now
+    
+    def try_acquire(self, n: float = 1) -> bool:
+        """
+        Take n tokens if available, without blocking
+        
+        Args:
+            n: Number of tokens to take
+            
+        Returns:
+            bool: True if tokens were taken, False if bucket is empty
+        """
+        with self._lock:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens -= n
+                return True
+            return False
+    
+    def return_token(self, n: float = 1):
+        """
+        Give back tokens for a request that did not complete
+        
+        Args:
+            n: Number of tokens to return
+        """
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + n)
 
 class GeminiVisionAnalyzer:
     """
@@ -28,17 +269,39 @@ class GeminiVisionAnalyzer:
         self.api_key = api_key
         self.model_name = model_name
         self.model = None
+        self._model_call = None  # Bound model.generate_content, set on initialize
+        self._timeout_errors: Tuple = (TimeoutError,)  # SDK deadline error added on initialize
         self.is_initialized = False
         self.logger = logging.getLogger(__name__)
         
         # Rate limiting
-        self.last_request_time = 0
-        self.min_request_interval = 1.0  # seconds
+        self.bucket = TokenBucket()
+        
+        # Circuit breaker, suspends requests after repeated failures
+        self._fail_count = 0
+        self._open_until = 0.0  # time.monotonic() deadline, 0.0 while closed
+        self._fail_threshold = AI_CIRCUIT_FAIL_THRESHOLD
+        self._cooldown = AI_CIRCUIT_COOLDOWN
         
-    def initialize(self) -> bool:
+        # Cache of recent analyses keyed by (image hash, prompt digest), each
+        # entry holds (result, time.monotonic() when stored)
+        self._cache: OrderedDict = OrderedDict()
+        self.cache_size = AI_CACHE_SIZE
+        self.cache_ttl = AI_CACHE_TTL
+        self.cache_hits = 0
+        self.api_requests = 0  # Requests actually sent, cache hits excluded
+        
+        # Recent frames sent together in the next batched request
+        self._frame_buffer: deque = deque(maxlen=min(AI_BATCH_SIZE, MAX_IMAGES_PER_REQUEST))
+        
+    def initialize(self, warmup: bool = False) -> bool:
         """
         Initialize Gemini API connection
+        Without warmup no request is made; auth errors surface on the first analysis
         
+        Args:
+            warmup: Send a minimal request to prime the connection and verify the key
+            
         Returns:
             bool: True if successful, False otherwise
         """
@@ -47,82 +310,323 @@ class GeminiVisionAnalyzer:
                 self.logger.error("Invalid or missing Gemini API key. Please set GEMINI_API_KEY environment variable.")
                 return False
                 
-            # Configure API
-            genai.configure(api_key=self.api_key)
+            # Imported here so simulation runs and tests without an API key skip
+            # the SDK's heavy import (~0.5 s)
+            import google.generativeai as genai
+            from google.api_core import exceptions as google_exceptions
+            self._timeout_errors = (google_exceptions.DeadlineExceeded, TimeoutError)
+            
+            # Configure API over gRPC so one HTTP/2 channel is reused across requests
+            genai.configure(api_key=self.api_key, transport='grpc')
             
             # Initialize model
             self.model = genai.GenerativeModel(self.model_name)
+            self._model_call = self.model.generate_content
             
-            # Test connection with a simple prompt
-            test_response = self.model.generate_content("Test connection")
-            if test_response:
-                self.is_initialized = True
-                self.logger.info(f"Gemini API initialized successfully with model {self.model_name}")
-                return True
-            else:
-                self.logger.error("Failed to get test response from Gemini API")
-                return False
+            # Warm up the channel (TLS/gRPC handshake) with a minimal request
+            if warmup:
+                test_response = self._model_call("hi", generation_config={'max_output_tokens': 1})
+                if not test_response:
+                    self.logger.error("Failed to get test response from Gemini API")
+                    return False
+            
+            self.is_initialized = True
+            self.logger.info(f"Gemini API initialized successfully with model {self.model_name}")
+            return True
                 
         except Exception as e:
             self.logger.error(f"Gemini API initialization failed: {e}")
             return False
     
-    def analyze_image(self, image: Image.Image, custom_prompt: Optional[str] = None) -> Optional[Dict]:
+    def analyze_image(self, image: ImageInput, custom_prompt: Optional[str] = None,
+                      image_key: Optional[int] = None) -> Optional[Decision]:
         """
         Analyze image using Gemini API
         
         Args:
-            image: PIL Image to analyze
+            image: OpenCV frame (BGR), PIL Image or JPEG bytes to analyze
             custom_prompt: Custom prompt (uses default if None)
+            image_key: Precomputed perceptual hash of the image (computed if None)
             
         Returns:
-            dict: Analysis result with action and reason
+            Decision: Analysis result with action and reason, or None if
+                  failed or rate limited (caller should reuse its last decision)
         """
         if not self.is_initialized or self.model is None:
             self.logger.error("Gemini API not initialized")
             return None
+        
+        prompt = custom_prompt if custom_prompt else AI_PROMPT
+        image = _shrink_image(image)
+        
+        # Serve near-identical scenes from cache without an API round-trip
+        if image_key is None:
+            image_key = perceptual_hash(image)
+        cache_key = (image_key, _prompt_digest(prompt))
+        cached = self._cache_lookup(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Fail fast while the API is down, before a rate limit token is taken
+        if self._circuit_open():
+            return None
             
-        # Rate limiting
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last
-            time.sleep(sleep_time)
+        # Rate limiting - skip this request rather than blocking the caller
+        if not self.bucket.try_acquire():
+            self.logger.debug("Gemini rate limit reached, skipping analysis")
+            return None
         
-        try:
-            prompt = custom_prompt if custom_prompt else AI_PROMPT
+        response_text = self._generate([_jpeg_blob(image), prompt])
+        if response_text is None:
+            return None
+        
+        result = self._parse_response(response_text)
+        self._cache_store(cache_key, result)
+        return result
+    
+    def buffer_frame(self, image: ImageInput, image_key: Optional[int] = None):
+        """
+        Add a frame to the buffer used for the next batched analysis
+        
+        Args:
+            image: OpenCV frame (BGR), PIL Image or JPEG bytes to buffer (oldest frames are dropped when full)
+            image_key: Precomputed perceptual hash of the frame (computed later if None)
+        """
+        self._frame_buffer.append((image, image_key))
+    
+    def has_buffered_frames(self) -> bool:
+        """
+        Check whether any frames are waiting for the next batched analysis
+        
+        Returns:
+            bool: True if the frame buffer is not empty
+        """
+        return bool(self._frame_buffer)
+    
+    def take_buffered_frames(self) -> Tuple[List[ImageInput], List[Optional[int]]]:
+        """
+        Remove and return all buffered frames, oldest first
+        
+        Returns:
+            tuple: (frames, image keys)
+        """
+        frames = [image for image, _ in self._frame_buffer]
+        keys = [key for _, key in self._frame_buffer]
+        self._frame_buffer.clear()
+        return frames, keys
+    
+    def analyze_buffered(self, custom_prompt: Optional[str] = None) -> Optional[List[Decision]]:
+        """
+        Analyze all buffered frames in a single request
+        The buffer is emptied whether or not the analysis succeeds
+        
+        Args:
+            custom_prompt: Custom prompt (uses default if None)
             
-            # Generate content with image and prompt with timeout
-            import signal
+        Returns:
+            list: Analysis results (see analyze_batch) or None if failed
+        """
+        frames, keys = self.take_buffered_frames()
+        return self.analyze_batch(frames, custom_prompt, keys)
+    
+    def analyze_batch(self, images: List[ImageInput], custom_prompt: Optional[str] = None,
+                      image_keys: Optional[List[Optional[int]]] = None) -> Optional[List[Decision]]:
+        """
+        Analyze consecutive frames (oldest first) with one Gemini request
+        
+        Args:
+            images: OpenCV frames (BGR) or PIL Images to analyze, oldest first
+            custom_prompt: Custom prompt (uses default if None)
+            image_keys: Precomputed perceptual hashes, one per image (None entries are computed)
             
-            def timeout_handler(signum, frame):
-                raise TimeoutError("Gemini API request timed out")
+        Returns:
+            list: One analysis result per answered frame, oldest first; the
+                  last entry always refers to the newest frame (a single entry
+                  is returned when the newest frame is served from cache),
+                  or None if failed, rate limited or the reply has no answer
+                  for the newest frame
+        """
+        if not self.is_initialized or self.model is None:
+            self.logger.error("Gemini API not initialized")
+            return None
+        
+        if not images:
+            return None
+        
+        count = min(len(images), MAX_IMAGES_PER_REQUEST)
+        images = [_shrink_image(image) for image in images[-count:]]
+        image_keys = image_keys[-count:] if image_keys else [None] * count
+        prompt = custom_prompt if custom_prompt else AI_PROMPT
+        prompt_key = _prompt_digest(prompt)
+        keys = [(key if key is not None else perceptual_hash(image), prompt_key)
+                for image, key in zip(images, image_keys)]
+        
+        # Nothing new to learn if the newest scene was already analyzed
+        cached = self._cache_lookup(keys[-1])
+        if cached is not None:
+            return [cached]
+        
+        if len(images) == 1:
+            result = self.analyze_image(images[0], custom_prompt, image_key=keys[0][0])
+            return [result] if result else None
+        
+        if self._circuit_open():
+            return None
+        
+        # One request per batch, regardless of frame count
+        if not self.bucket.try_acquire():
+            self.logger.debug("Gemini rate limit reached, skipping batch analysis")
+            return None
+        
+        batched_prompt = prompt + _BATCH_PROMPT_SUFFIX.format(n=len(images))
+        response_text = self._generate([*(_jpeg_blob(image) for image in images), batched_prompt])
+        if response_text is None:
+            return None
+        
+        # Split into answers by frame number (1 = oldest), so a skipped or
+        # out of range frame never shifts answers onto the wrong frames
+        parts = _FRAME_SPLIT_RE.split(response_text)
+        if len(parts) == 1:
+            # Model ignored the per-frame format, treat it as the newest frame's answer
+            blocks = {len(images): response_text}
+        else:
+            blocks = {}
+            for number, block in zip(map(int, parts[1::2]), parts[2::2]):
+                if 1 <= number <= len(images) and block.strip():
+                    blocks.setdefault(number, block)
+        
+        results = []
+        for number in sorted(blocks):
+            result = self._parse_response(blocks[number])
+            self._cache_store(keys[number - 1], result)
+            results.append(result)
+        
+        if len(images) not in blocks:
+            self.logger.warning("Gemini reply has no answer for the newest frame")
+            return None
+        return results
+    
+    def _generate(self, contents: List) -> Optional[str]:
+        """
+        Send a generate_content request with a timeout
+        The rate limit token is returned if the request fails
+        
+        Args:
+            contents: Images and prompt to send
             
-            # Set timeout of 30 seconds
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(30)
+        Returns:
+            str: Response text or None if failed
+        """
+        self.api_requests += 1
+        try:
+            response = self._model_call(
+                contents, request_options={'timeout': AI_REQUEST_TIMEOUT}
+            )
             
-            try:
-                response = self.model.generate_content([image, prompt])
-                self.last_request_time = time.time()
-                
-                if response and response.text:
-                    return self._parse_response(response.text)
-                else:
-                    self.logger.warning("Empty response from Gemini API")
-                    return None
-                    
-            finally:
-                signal.alarm(0)  # Cancel the alarm
+            self._record_success()
+            if response and response.text:
+                return response.text
+            else:
+                self.logger.warning("Empty response from Gemini API")
+                return None
                 
-        except TimeoutError:
-            self.logger.error("Gemini API request timed out after 30 seconds")
+        except self._timeout_errors:
+            self.bucket.return_token()
+            self.logger.error(f"Gemini API request timed out after {AI_REQUEST_TIMEOUT:.0f} seconds")
+            self._record_failure()
             return None
         except Exception as e:
+            self.bucket.return_token()
             self.logger.error(f"Image analysis failed: {e}")
+            self._record_failure()
+            return None
+    
+    @property
+    def is_circuit_open(self) -> bool:
+        """True from the circuit opening until a request completes again"""
+        return bool(self._open_until)
+    
+    def _circuit_open(self) -> bool:
+        """
+        Check whether requests are suspended after repeated failures
+        Once the cooldown expires one trial request is let through
+        
+        Returns:
+            bool: True if the request should be skipped
+        """
+        if time.monotonic() < self._open_until:
+            self.logger.debug("Gemini circuit breaker open, skipping analysis")
+            return True
+        return False
+    
+    def _record_failure(self):
+        """
+        Count a failed request and open the circuit at the failure threshold
+        """
+        self._fail_count += 1
+        if self._fail_count < self._fail_threshold:
+            return
+        
+        if not self._open_until:
+            self.logger.warning(
+                "Gemini API failed %d times in a row, suspending requests for %.0f seconds",
+                self._fail_count, self._cooldown
+            )
+        # A failed trial request after the cooldown reopens the circuit
+        self._open_until = time.monotonic() + self._cooldown
+    
+    def _record_success(self):
+        """
+        Reset the failure count and close the circuit after a completed request
+        """
+        if self._open_until:
+            self.logger.info("Gemini API recovered, resuming requests")
+        self._fail_count = 0
+        self._open_until = 0.0
+    
+    def _cache_lookup(self, key: Tuple) -> Optional[Decision]:
+        """
+        Look up a cached analysis and mark it as recently used
+        Entries older than cache_ttl are dropped so a stale decision is not
+        replayed for a scene that has changed in ways the hash cannot see
+        
+        Args:
+            key: Cache key (image hash, prompt digest)
+            
+        Returns:
+            Decision: Copy of the cached result with a fresh timestamp, or None
+        """
+        entry = self._cache.get(key)
+        if entry is None:
             return None
+        
+        cached, stored_at = entry
+        if time.monotonic() - stored_at > self.cache_ttl:
+            del self._cache[key]
+            return None
+        
+        self._cache.move_to_end(key)
+        self.cache_hits += 1
+        return replace(cached, timestamp=time.time())
     
-    def _parse_response(self, response_text: str) -> Dict:
+    def _cache_store(self, key: Tuple, result: Decision):
+        """
+        Store an analysis in the LRU cache, evicting the oldest entry if full
+        Frames without texture (hash 0) are not stored
+        
+        Args:
+            key: Cache key (image hash, prompt digest)
+            result: Parsed analysis result
+        """
+        if key[0] == 0:
+            return
+        
+        self._cache[key] = (result, time.monotonic())
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    def _parse_response(self, response_text: str) -> Decision:
         """
         Parse Gemini API response to extract action and reason
         
@@ -130,12 +634,12 @@ class GeminiVisionAnalyzer:
             response_text: Raw response from API
             
         Returns:
-            dict: Parsed response with action and reason
+            Decision: Parsed response with action and reason
         """
         try:
             # Look for ACTION: and REASON: patterns
-            action_match = re.search(r'ACTION:\s*(\w+)', response_text, re.IGNORECASE)
-            reason_match = re.search(r'REASON:\s*(.+?)(?:\n|$)', response_text, re.IGNORECASE)
+            action_match = _ACTION_RE.search(response_text)
+            reason_match = _REASON_RE.search(response_text)
             
             action = None
             reason = "No reason provided"
@@ -143,18 +647,10 @@ class GeminiVisionAnalyzer:
             if action_match:
                 action = action_match.group(1).lower()
             else:
-                # Fallback: look for common action words
-                response_lower = response_text.lower()
-                if 'move_forward' in response_lower or 'forward' in response_lower:
-                    action = 'move_forward'
-                elif 'turn_left' in response_lower or 'left' in response_lower:
-                    action = 'turn_left'
-                elif 'turn_right' in response_lower or 'right' in response_lower:
-                    action = 'turn_right'
-                elif 'move_backward' in response_lower or 'backward' in response_lower:
-                    action = 'move_backward'
-                elif 'stop' in response_lower:
-                    action = 'stop'
+                # Fallback: first action word mentioned, default to safe stop
+                fallback_match = _FALLBACK_RE.search(response_text)
+                if fallback_match:
+                    action = _FALLBACK_ACTIONS[fallback_match.group(1).lower()]
                 else:
                     action = 'stop'  # Default safe action
             
@@ -163,33 +659,37 @@ class GeminiVisionAnalyzer:
             else:
                 reason = response_text[:100] + "..." if len(response_text) > 100 else response_text
             
-            result = {
-                'action': action,
-                'reason': reason,
-                'raw_response': response_text,
-                'confidence': self._estimate_confidence(response_text),
-                'timestamp': time.time()
-            }
+            result = Decision(
+                action=action,
+                reason=reason,
+                raw_response=response_text,
+                confidence=self._estimate_confidence(
+                    response_text, bool(action_match and reason_match)
+                ),
+                timestamp=time.time()
+            )
             
-            self.logger.info(f"AI Decision: {action} - {reason}")
+            self.logger.info("AI Decision: %s - %s", action, reason)
             return result
             
         except Exception as e:
             self.logger.error(f"Response parsing failed: {e}")
-            return {
-                'action': 'stop',
-                'reason': 'Failed to parse AI response',
-                'raw_response': response_text,
-                'confidence': 0.0,
-                'timestamp': time.time()
-            }
+            return Decision(
+                action='stop',
+                reason='Failed to parse AI response',
+                raw_response=response_text,
+                confidence=0.0,
+                timestamp=time.time()
+            )
     
-    def _estimate_confidence(self, response_text: str) -> float:
+    def _estimate_confidence(self, response_text: str,
+                             structured: Optional[bool] = None) -> float:
         """
         Estimate confidence level based on response characteristics
         
         Args:
             response_text: Response text to analyze
+            structured: Whether ACTION/REASON fields were found, scanned if None
             
         Returns:
             float: Confidence score (0.0 to 1.0)
@@ -197,7 +697,9 @@ class GeminiVisionAnalyzer:
         confidence = 0.5  # Base confidence
         
         # Increase confidence for structured responses
-        if 'ACTION:' in response_text and 'REASON:' in response_text:
+        if structured is None:
+            structured = 'ACTION:' in response_text and 'REASON:' in response_text
+        if structured:
             confidence += 0.3
         
         # Increase confidence for detailed reasoning
@@ -205,42 +707,26 @@ class GeminiVisionAnalyzer:
             confidence += 0.1
         
         # Decrease confidence for uncertain language
-        uncertain_terms = ['maybe', 'might', 'possibly', 'unclear', 'uncertain']
-        for term in uncertain_terms:
-            if term in response_text.lower():
-                confidence -= 0.1
+        confidence -= 0.1 * len(_UNCERTAIN_RE.findall(response_text))
         
         return max(0.0, min(1.0, confidence))
     
-    def get_safety_analysis(self, image: Image.Image) -> Optional[Dict]:
+    def get_safety_analysis(self, image: ImageInput) -> Optional[Decision]:
         """
         Perform safety-focused analysis of the image
         
         Args:
-            image: PIL Image to analyze
+            image: OpenCV frame (BGR), PIL Image or JPEG bytes to analyze
             
         Returns:
-            dict: Safety analysis result
+            Decision: Safety analysis result
         """
-        safety_prompt = """
-        Analyze this image for safety concerns for a humanoid robot:
-        
-        1. Are there any people or animals in the scene?
-        2. Are there any dangerous obstacles (stairs, holes, fragile objects)?
-        3. Is the ground stable and safe for walking?
-        4. Are there any moving objects or vehicles?
-        
-        Respond with:
-        SAFETY: SAFE/CAUTION/DANGER
-        CONCERNS: [list any safety concerns]
-        RECOMMENDATION: [safety recommendation]
-        """
-        
-        return self.analyze_image(image, safety_prompt)
+        return self.analyze_image(image, _SAFETY_PROMPT)
     
     def test_connection(self) -> bool:
         """
         Test API connection with a simple request
+        Use this to verify connectivity explicitly, initialize() does not by default
         
         Returns:
             bool: True if connection successful
@@ -277,17 +763,13 @@ def test_gemini_api():
     else:
         print("Connection test failed")
     
-    # Test with a simple image (create a test image)
+    # Test with a simple image (create a test frame)
     try:
-        from PIL import Image
-        import numpy as np
-        
-        # Create a test image
-        test_array = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
-        test_image = Image.fromarray(test_array)
+        # Create a test frame (BGR, as delivered by the camera)
+        test_frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
         
-        # Analyze test image
-        result = analyzer.analyze_image(test_image)
+        # Analyze test frame
+        result = analyzer.analyze_image(test_frame)
         if result:
             print(f"Analysis successful: {result}")
         else:
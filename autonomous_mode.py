@@ -10,32 +10,57 @@ Version: 1.0
 
 import time
 import logging
+import logging.handlers
 import signal
 import sys
-from typing import Optional, Dict
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Optional, Dict, Union
 from datetime import datetime
 
+import cv2
+import numpy as np
+
 # Import our custom modules
 from camera_module import CameraCapture
-from ai_vision import GeminiVisionAnalyzer
+from ai_vision import GeminiVisionAnalyzer, Decision, perceptual_hash
 from robot_control import RobotController
-from config import LOOP_RATE, AI_QUERY_INTERVAL
+from config import (
+    LOOP_RATE, AI_QUERY_INTERVAL, AI_BATCH_SIZE, AI_REQUEST_TIMEOUT,
+    AI_QUERY_BACKOFF_MAX, AI_SCENE_CHANGE_THRESHOLD
+)
+
+# Internal timing uses integer nanoseconds from time.monotonic_ns()
+_NS = 1_000_000_000
+
+@dataclass
+class Stats:
+    """Run statistics for the autonomous loop"""
+    start_time: float = 0.0
+    total_frames: int = 0
+    ai_queries: int = 0
+    movement_commands: int = 0
+    safety_stops: int = 0
+    skipped_ticks: int = 0
 
 class AutonomousRobot:
     """
     Main autonomous robot controller that integrates all subsystems
     """
     
-    def __init__(self, simulation_mode: bool = False):
+    def __init__(self, simulation_mode: bool = False, log_level: str = 'INFO'):
         """
         Initialize autonomous robot system
         
         Args:
             simulation_mode: Run in simulation without hardware
+            log_level: Level for the log file ('DEBUG', 'INFO', 'WARNING', 'ERROR')
         """
         self.simulation_mode = simulation_mode
         self.running = False
-        self.logger = self._setup_logging()
+        self._stop_evt = threading.Event()
+        self.logger = self._setup_logging(log_level)
         
         # Initialize subsystems
         self.camera = CameraCapture()
@@ -43,35 +68,48 @@ class AutonomousRobot:
         self.robot_control = RobotController(simulation_mode)
         
         # Timing control
-        self.loop_interval = 1.0 / LOOP_RATE
-        self.ai_query_interval = AI_QUERY_INTERVAL
-        self.last_ai_query = 0.0
+        self._loop_interval_ns = int(_NS / LOOP_RATE)
+        self._base_ai_query_interval_ns = int(AI_QUERY_INTERVAL * _NS)
+        self._max_ai_query_interval_ns = self._base_ai_query_interval_ns * AI_QUERY_BACKOFF_MAX
+        self._ai_query_interval_ns = self._base_ai_query_interval_ns
+        self._ai_timeout_ns = int(AI_REQUEST_TIMEOUT * _NS)
+        # Start one interval in the past so the first query fires immediately
+        self._last_ai_query_ns = -self._ai_query_interval_ns
+        self._last_frame_sample_ns = -self._ai_query_interval_ns
+        
+        # Scene change tracking for the adaptive AI query interval
+        self._last_gray_small: Optional[np.ndarray] = None
+        self._scene_changed = True
+        
+        # AI requests run in the background so the loop never waits on the network
+        self._ai_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai_vision')
+        self._pending: Optional[Future] = None
+        self._pending_since_ns = 0
         
         # State tracking
         self.current_action = "stop"
         self.last_decision = None
-        self.statistics = {
-            'start_time': 0.0,
-            'total_frames': 0,
-            'ai_queries': 0,
-            'movement_commands': 0,
-            'safety_stops': 0
-        }
+        self.statistics = Stats()
         
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
     
-    def _setup_logging(self) -> logging.Logger:
+    def _setup_logging(self, log_level: str = 'INFO') -> logging.Logger:
         """
         Setup logging configuration
         
+        Args:
+            log_level: Level for the log file
+            
         Returns:
             logging.Logger: Configured logger
         """
+        file_level = getattr(logging, log_level)
+        
         # Create logger
         logger = logging.getLogger('AutonomousRobot')
-        logger.setLevel(logging.INFO)
+        logger.setLevel(min(file_level, logging.INFO))
         
         # Create formatters
         console_formatter = logging.Formatter(
@@ -88,14 +126,37 @@ class AutonomousRobot:
         console_handler.setFormatter(console_formatter)
         logger.addHandler(console_handler)
         
-        # File handler
-        file_handler = logging.FileHandler(f'autonomous_robot_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(file_formatter)
+        # File handler - rotating file behind a memory buffer so records are
+        # written in batches instead of one write per message
+        file_target = logging.handlers.RotatingFileHandler(
+            f'autonomous_robot_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log',
+            maxBytes=10 * 1024 * 1024,
+            backupCount=5
+        )
+        file_target.setFormatter(file_formatter)
+        file_handler = logging.handlers.MemoryHandler(
+            capacity=256,
+            flushLevel=logging.WARNING,
+            target=file_target
+        )
+        file_handler.setLevel(file_level)
         logger.addHandler(file_handler)
+        self._file_handler = file_handler
+        # The logger is shared by every robot instance, keep ours to detach later
+        self._log_handlers = (console_handler, file_handler, file_target)
         
         return logger
     
+    def _close_logging(self):
+        """
+        Detach this robot's handlers from the shared logger and close the log file
+        """
+        # Closing the memory handler flushes it into the file handler, which
+        # it leaves open, so the file handler is closed last
+        for handler in self._log_handlers:
+            self.logger.removeHandler(handler)
+            handler.close()
+    
     def initialize(self) -> bool:
         """
         Initialize all subsystems
@@ -111,7 +172,7 @@ class AutonomousRobot:
             return False
         
         # Initialize AI vision
-        if not self.ai_vision.initialize():
+        if not self.ai_vision.initialize(warmup=not self.simulation_mode):
             self.logger.error("Failed to initialize AI vision system")
             return False
         
@@ -134,38 +195,86 @@ class AutonomousRobot:
         self.logger.info(f"Received signal {signum}, initiating shutdown...")
         self.stop()
     
-    def capture_and_analyze(self) -> Optional[Dict]:
+    def capture_and_analyze(self) -> Optional[Decision]:
         """
         Capture camera frame and analyze with AI
         
         Returns:
-            dict: AI analysis result or None if failed
+            Decision: AI analysis result or None if failed
         """
         try:
-            # Capture frame
-            frame = self.camera.capture_frame()
-            if frame is None:
+            # Grab every tick to keep the camera queue drained, decode only sampled frames
+            if not self.camera.grab_frame():
                 self.logger.warning("Failed to capture camera frame")
                 return None
             
-            self.statistics['total_frames'] += 1
+            self.statistics.total_frames += 1
             
-            # Convert to PIL image for AI analysis
-            pil_image = self.camera.frame_to_pil(frame)
-            if pil_image is None:
-                self.logger.warning("Failed to convert frame to PIL image")
-                return None
-            
-            # Analyze with AI (with rate limiting)
-            current_time = time.time()
-            if current_time - self.last_ai_query >= self.ai_query_interval:
-                analysis_result = self.ai_vision.analyze_image(pil_image)
-                if analysis_result:
-                    self.last_ai_query = current_time
-                    self.statistics['ai_queries'] += 1
-                    return analysis_result
+            # Sample frames across the query interval for the next batched request
+            now_ns = time.monotonic_ns()
+            query_due = (self._pending is None and
+                         now_ns - self._last_ai_query_ns >= self._ai_query_interval_ns)
+            sample_interval_ns = self._ai_query_interval_ns // AI_BATCH_SIZE
+            next_sample_ns = min(self._last_frame_sample_ns + sample_interval_ns,
+                                 self._last_ai_query_ns + self._ai_query_interval_ns)
+            if query_due or now_ns >= next_sample_ns:
+                # Never waits on the camera; a frame that is not ready skips this sample
+                frame = self.camera.retrieve_frame()
+                if frame is None:
+                    self.logger.debug("Camera frame not decoded yet, skipping sample")
                 else:
-                    self.logger.warning("AI analysis failed")
+                    gray_small = self._track_scene_change(frame)
+                    # Hash of the small gray patch doubles as the analysis cache key
+                    self.ai_vision.buffer_frame(frame, perceptual_hash(gray_small))
+                    self._last_frame_sample_ns = now_ns
+            elif now_ns + self._loop_interval_ns >= next_sample_ns:
+                # Sample due next tick, let the camera reader decode one meanwhile
+                self.camera.request_frame()
+            
+            # Analyze buffered frames with AI in the background (with rate limiting),
+            # a query with no frame sampled yet waits for the next tick
+            if query_due and self.ai_vision.has_buffered_frames():
+                if not self._scene_changed:
+                    # Static scene - back off to save API quota
+                    self._ai_query_interval_ns = min(2 * self._ai_query_interval_ns,
+                                                     self._max_ai_query_interval_ns)
+                self._scene_changed = False
+                
+                frames, keys = self.ai_vision.take_buffered_frames()
+                self._pending = self._ai_pool.submit(self.ai_vision.analyze_batch, frames, None, keys)
+                self._pending_since_ns = now_ns
+                self._last_ai_query_ns = now_ns
+            
+            # Pick up a finished analysis without blocking
+            if self._pending is not None:
+                if self._pending.done():
+                    # Clear the request first so a failed one is not picked up again
+                    pending, self._pending = self._pending, None
+                    try:
+                        analysis_results = pending.result()
+                    except Exception as e:
+                        self.logger.error(f"AI analysis failed: {e}")
+                        analysis_results = None
+                    # Count requests actually sent, not answers served from cache
+                    self.statistics.ai_queries = self.ai_vision.api_requests
+                    if analysis_results:
+                        # Newest frame's decision drives the robot
+                        self.last_decision = analysis_results[-1]
+                        return self.last_decision
+                    # None means failed or rate limited - keep the last decision
+                    # instead of stalling the loop
+                    self.logger.debug("No AI result this tick, reusing last decision")
+                elif now_ns - self._pending_since_ns > self._ai_timeout_ns:
+                    self.logger.error(f"AI request timed out after {AI_REQUEST_TIMEOUT:.0f} seconds")
+                    self._pending.cancel()
+                    self._pending = None
+            
+            # Gemini is unavailable, drop the stale decision so the loop stops the robot
+            if self.ai_vision.is_circuit_open:
+                if self.last_decision is not None:
+                    self.logger.warning("Gemini circuit breaker open, falling back to stop")
+                    self.last_decision = None
+                return None
             
             # Return last decision if within query interval
             return self.last_decision
@@ -174,12 +283,35 @@ class AutonomousRobot:
             self.logger.error(f"Capture and analyze failed: {e}")
             return None
     
-    def execute_decision(self, decision: Dict) -> bool:
+    def _track_scene_change(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Compare the frame with the previously sampled one and return to the
+        base AI query interval as soon as the scene changes
+        
+        Args:
+            frame: Current camera frame (BGR)
+            
+        Returns:
+            numpy.ndarray: Downsampled grayscale frame (64x48)
+        """
+        gray = cv2.cvtColor(cv2.resize(frame, (64, 48), interpolation=cv2.INTER_AREA),
+                            cv2.COLOR_BGR2GRAY)
+        
+        if self._last_gray_small is not None:
+            delta = float(np.abs(gray.astype(np.int16) - self._last_gray_small).mean())
+            if delta > AI_SCENE_CHANGE_THRESHOLD:
+                self._ai_query_interval_ns = self._base_ai_query_interval_ns
+                self._scene_changed = True
+        
+        self._last_gray_small = gray
+        return gray
+    
+    def execute_decision(self, decision: Union[Decision, Dict]) -> bool:
         """
         Execute movement decision from AI analysis
         
         Args:
-            decision: AI decision dictionary
+            decision: AI decision (legacy decision dictionaries are also accepted)
             
         Returns:
             bool: True if command executed successfully
@@ -188,28 +320,30 @@ class AutonomousRobot:
             if not decision:
                 return False
             
-            action = decision.get('action', 'stop')
-            reason = decision.get('reason', 'No reason provided')
-            confidence = decision.get('confidence', 0.0)
+            if isinstance(decision, dict):
+                decision = Decision.from_dict(decision)
+            action = decision.action
+            reason = decision.reason
+            confidence = decision.confidence
             
             # Log decision
-            self.logger.info(f"AI Decision: {action} (confidence: {confidence:.2f}) - {reason}")
+            self.logger.info("AI Decision: %s (confidence: %.2f) - %s", action, confidence, reason)
             
             # Safety check before movement
             if not self.robot_control.is_safe_to_move():
                 self.logger.warning("Safety conditions not met, stopping robot")
                 self.robot_control.stop_move()
-                self.statistics['safety_stops'] += 1
+                self.statistics.safety_stops += 1
                 return False
             
             # Execute movement command
             success = self.robot_control.execute_ai_command(action)
             if success:
                 self.current_action = action
-                self.statistics['movement_commands'] += 1
-                self.logger.debug (f"Movement command '{action}' executed successfully")
+                self.statistics.movement_commands += 1
+                self.logger.debug("Movement command '%s' executed successfully", action)
             else:
-                self.logger.warning(f"Failed to execute movement command '{action}'")
+                self.logger.warning("Failed to execute movement command '%s'", action)
             
             return success
             
@@ -222,11 +356,10 @@ class AutonomousRobot:
         Main autonomous navigation loop
         """
         self.logger.info("Starting autonomous navigation loop")
-        self.statistics['start_time'] = time.time()
+        self.statistics.start_time = time.time()
+        next_tick_ns = time.monotonic_ns() + self._loop_interval_ns
         
-        while self.running:
-            loop_start_time = time.time()
-            
+        while not self._stop_evt.is_set():
             try:
                 # Update robot state
                 self.robot_control.update_state()
@@ -235,8 +368,11 @@ class AutonomousRobot:
                 if not self.robot_control.is_safe_to_move():
                     self.logger.warning("Safety conditions failed, stopping")
                     self.robot_control.stop_move()
-                    self.statistics['safety_stops'] += 1
-                    time.sleep(1.0)  # Wait before retrying
+                    self.statistics.safety_stops += 1
+                    if self._stop_evt.wait(1.0):  # Wait before retrying
+                        break
+                    # The wait is not a missed tick, restart the schedule from now
+                    next_tick_ns = time.monotonic_ns() + self._loop_interval_ns
                     continue
                 
                 # Capture and analyze environment
@@ -254,19 +390,28 @@ class AutonomousRobot:
                         self.current_action = "stop"
                 
                 # Log periodic status
-                if self.statistics['total_frames'] % 100 == 0:
+                if self.statistics.total_frames % 100 == 0:
                     self._log_status()
                 
             except Exception as e:
                 self.logger.error(f"Error in autonomous loop: {e}")
                 # Emergency stop on unexpected error
                 self.robot_control.stop_move()
-                time.sleep(1.0)
+                if self._stop_evt.wait(1.0):
+                    break
+                next_tick_ns = time.monotonic_ns() + self._loop_interval_ns
+                continue
             
-            # Maintain loop timing
-            loop_duration = time.time() - loop_start_time
-            sleep_time = max(0, self.loop_interval - loop_duration)
-            time.sleep(sleep_time)
+            # Maintain loop timing against absolute deadlines so jitter does not accumulate
+            now_ns = time.monotonic_ns()
+            delay_ns = next_tick_ns - now_ns
+            if delay_ns > 0 and self._stop_evt.wait(delay_ns / _NS):
+                break
+            next_tick_ns += self._loop_interval_ns
+            if now_ns - next_tick_ns > self._loop_interval_ns:
+                # Too far behind to catch up - skip missed ticks and resync
+                self.statistics.skipped_ticks += (now_ns - next_tick_ns) // self._loop_interval_ns
+                next_tick_ns = now_ns + self._loop_interval_ns
         
         self.logger.info("Autonomous loop ended")
     
@@ -274,20 +419,23 @@ class AutonomousRobot:
         """
         Log current system status
         """
-        runtime = time.time() - self.statistics['start_time']
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        
+        runtime = time.time() - self.statistics.start_time
         robot_info = self.robot_control.get_robot_info()
         
-        status_msg = (
-            f"Status Update - Runtime: {runtime:.1f}s, "
-            f"Frames: {self.statistics['total_frames']}, "
-            f"AI Queries: {self.statistics['ai_queries']}, "
-            f"Commands: {self.statistics['movement_commands']}, "
-            f"Safety Stops: {self.statistics['safety_stops']}, "
-            f"Current Action: {self.current_action}, "
-            f"Battery: {robot_info['state'].battery_level:.1f}%"
+        self.logger.info(
+            "Status Update - Runtime: %.1fs, Frames: %d, AI Queries: %d, Commands: %d, "
+            "Safety Stops: %d, Current Action: %s, Battery: %.1f%%",
+            runtime,
+            self.statistics.total_frames,
+            self.statistics.ai_queries,
+            self.statistics.movement_commands,
+            self.statistics.safety_stops,
+            self.current_action,
+            robot_info['state'].battery_level
         )
-        
-        self.logger.info(status_msg)
     
     def start(self):
         """
@@ -305,6 +453,7 @@ class AutonomousRobot:
             return
         
         # Start autonomous loop
+        self._stop_evt.clear()
         self.running = True
         
         try:
@@ -314,12 +463,21 @@ class AutonomousRobot:
         except Exception as e:
             self.logger.error(f"Autonomous mode error: {e}")
         finally:
-            self.stop()
+            self.shutdown()
     
     def stop(self):
         """
-        Stop autonomous mode gracefully
+        Request autonomous mode to stop
+        Only sets the stop event, so it is safe to call from signal handlers
+        and other threads; the loop exits immediately and start() shuts down
         """
+        self._stop_evt.set()
+    
+    def shutdown(self):
+        """
+        Stop autonomous mode gracefully and shut down all subsystems
+        """
+        self._stop_evt.set()
         if not self.running:
             return
         
@@ -329,6 +487,15 @@ class AutonomousRobot:
         # Stop robot movement
         self.robot_control.stop_move()
         
+        # Drop any in-flight AI request (at most one is queued at a time). The
+        # replacement executor starts no threads until used and lets start()
+        # run the robot again
+        if self._pending is not None:
+            self._pending.cancel()
+        self._ai_pool.shutdown(wait=False)
+        self._ai_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai_vision')
+        self._pending = None
+        
         # Shutdown subsystems
         self.robot_control.shutdown()
         self.camera.release()
@@ -337,25 +504,30 @@ class AutonomousRobot:
         self._log_final_stats()
         
         self.logger.info("Autonomous mode stopped")
+        
+        # Make sure buffered log records reach disk
+        self._file_handler.flush()
     
     def _log_final_stats(self):
         """
         Log final run statistics
         """
-        if self.statistics['start_time'] > 0:
-            runtime = time.time() - self.statistics['start_time']
+        stats = asdict(self.statistics)
+        if stats['start_time'] > 0:
+            runtime = time.time() - stats['start_time']
             
             # Prevent division by zero
-            avg_fps = self.statistics['total_frames'] / runtime if runtime > 0 else 0.0
-            ai_rate = self.statistics['ai_queries'] / runtime if runtime > 0 else 0.0
+            avg_fps = stats['total_frames'] / runtime if runtime > 0 else 0.0
+            ai_rate = stats['ai_queries'] / runtime if runtime > 0 else 0.0
             
             stats_msg = (
                 f"Final Statistics:\n"
                 f"  Total Runtime: {runtime:.1f} seconds\n"
-                f"  Frames Processed: {self.statistics['total_frames']}\n"
-                f"  AI Queries: {self.statistics['ai_queries']}\n"
-                f"  Movement Commands: {self.statistics['movement_commands']}\n"
-                f"  Safety Stops: {self.statistics['safety_stops']}\n"
+                f"  Frames Processed: {stats['total_frames']}\n"
+                f"  AI Queries: {stats['ai_queries']}\n"
+                f"  Movement Commands: {stats['movement_commands']}\n"
+                f"  Safety Stops: {stats['safety_stops']}\n"
+                f"  Skipped Ticks: {stats['skipped_ticks']}\n"
                 f"  Average FPS: {avg_fps:.1f}\n"
                 f"  AI Query Rate: {ai_rate:.2f} Hz"
             )
@@ -381,7 +553,7 @@ def main():
     logging.getLogger().setLevel(getattr(logging, args.log_level))
     
     # Create and start autonomous robot
-    robot = AutonomousRobot(simulation_mode=args.sim)
+    robot = AutonomousRobot(simulation_mode=args.sim, log_level=args.log_level)
     
     print("=== Unitree G1 Autonomous Navigation System ===")
     print(f"Mode: {'Simulation' if args.sim else 'Hardware'}")
@@ -395,7 +567,7 @@ def main():
     except Exception as e:
         print(f"Fatal error: {e}")
     finally:
-        robot.stop()
+        robot.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
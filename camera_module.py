@@ -5,12 +5,89 @@ Handles OpenCV camera interface and image processing for AI analysis
 
 import cv2
 import numpy as np
-import base64
-import io
+import binascii
+import sys
+import threading
 from PIL import Image
 from typing import Optional
 import logging
-from config import CAMERA_INDEX, FRAME_WIDTH, FRAME_HEIGHT, FPS
+from config import (
+    CAMERA_INDEX, FRAME_WIDTH, FRAME_HEIGHT, FPS, CAMERA_BUFFER_SIZE, CAMERA_FOURCC,
+    AI_IMAGE_MAX_SIZE
+)
+
+try:
+    import simplejpeg
+    SIMPLEJPEG_AVAILABLE = True
+except ImportError:
+    SIMPLEJPEG_AVAILABLE = False
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _turbo_jpeg = TurboJPEG()  # Raises if the libturbojpeg shared library is missing
+    TURBOJPEG_AVAILABLE = True
+except (ImportError, OSError, RuntimeError):
+    TURBOJPEG_AVAILABLE = False
+
+try:
+    import pybase64
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    PYBASE64_AVAILABLE = False
+
+try:
+    from linuxpy.video.device import Device, VideoCapture
+    LINUXPY_AVAILABLE = True
+except ImportError:
+    LINUXPY_AVAILABLE = False
+
+# JPEG encoder used by frame_to_base64, fastest available first
+if SIMPLEJPEG_AVAILABLE:
+    JPEG_ENCODER = 'simplejpeg'
+elif TURBOJPEG_AVAILABLE:
+    JPEG_ENCODER = 'turbojpeg'
+else:
+    JPEG_ENCODER = 'opencv'
+
+# Native capture backend per platform, other platforms let OpenCV choose
+if sys.platform.startswith('linux'):
+    _CAPTURE_BACKEND = cv2.CAP_V4L2
+elif sys.platform == 'darwin':
+    _CAPTURE_BACKEND = cv2.CAP_AVFOUNDATION
+else:
+    _CAPTURE_BACKEND = cv2.CAP_ANY
+
+def _b64encode(data) -> str:
+    """
+    Base64 encode a bytes-like buffer, using pybase64's SIMD codec if installed
+    
+    Args:
+        data: Bytes or encoder output buffer
+        
+    Returns:
+        str: Base64 encoded data without a trailing newline
+    """
+    if PYBASE64_AVAILABLE:
+        return pybase64.b64encode(data).decode('ascii')
+    return binascii.b2a_base64(data, newline=False).decode('ascii')
+
+def shrink_frame(frame: np.ndarray, max_size: int = AI_IMAGE_MAX_SIZE) -> np.ndarray:
+    """
+    Downscale a frame so its longest side fits max_size, keeping the aspect ratio
+    
+    Args:
+        frame: OpenCV frame (BGR)
+        max_size: Longest side in pixels
+        
+    Returns:
+        numpy.ndarray: Downscaled copy, or the original frame if already small enough
+    """
+    height, width = frame.shape[:2]
+    if max(width, height) <= max_size:
+        return frame
+    scale = max_size / max(width, height)
+    return cv2.resize(frame, (round(width * scale), round(height * scale)),
+                      interpolation=cv2.INTER_AREA)
 
 class CameraCapture:
     """
@@ -30,6 +107,22 @@ class CameraCapture:
         self.is_initialized = False
         self.logger = logging.getLogger(__name__)
         
+        # Background reader keeps the driver queue drained and decodes on request
+        self._reader_thread: Optional[threading.Thread] = None
+        self._latest_frame: Optional[np.ndarray] = None
+        self._frame_lock = threading.Lock()
+        self._frame_event = threading.Event()  # set when a requested frame is stored, until taken
+        self._want_frame = threading.Event()   # set when a consumer needs a new frame
+        self._stop_evt = threading.Event()
+        self._grab_ok = False
+        
+        # Reusable BGR->RGB conversion buffer, sized on initialize or first use
+        self._rgb_buf: Optional[np.ndarray] = None
+        
+        # JPEG encoder parameters, built once rather than per frame
+        self._enc_quality = 85
+        self._enc_params = [int(cv2.IMWRITE_JPEG_QUALITY), self._enc_quality]
+        
     def initialize(self) -> bool:
         """
         Initialize camera connection
@@ -38,16 +131,26 @@ class CameraCapture:
             bool: True if successful, False otherwise
         """
         try:
-            self.cap = cv2.VideoCapture(self.camera_index)
+            self.cap = cv2.VideoCapture(self.camera_index, _CAPTURE_BACKEND)
+            if not self.cap.isOpened() and _CAPTURE_BACKEND != cv2.CAP_ANY:
+                # Native backend unavailable in this OpenCV build
+                self.cap = cv2.VideoCapture(self.camera_index)
             
             if not self.cap.isOpened():
                 self.logger.error(f"Failed to open camera {self.camera_index}")
                 return False
                 
+            # Keep the driver queue short so grabbed frames are current, not stale
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, CAMERA_BUFFER_SIZE)
+            
+            # Request the pixel format before the resolution so the driver negotiates both
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*CAMERA_FOURCC))
+            
             # Set camera properties
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
             self.cap.set(cv2.CAP_PROP_FPS, FPS)
+            self._rgb_buf = np.empty((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
             
             # Test capture
             ret, frame = self.cap.read()
@@ -56,6 +159,7 @@ class CameraCapture:
                 return False
                 
             self.is_initialized = True
+            self._start_reader()
             self.logger.info(f"Camera {self.camera_index} initialized successfully")
             return True
             
@@ -63,6 +167,85 @@ class CameraCapture:
             self.logger.error(f"Camera initialization failed: {e}")
             return False
     
+    def _start_reader(self):
+        """
+        Start the background reader thread
+        """
+        self._stop_evt.clear()
+        self._want_frame.clear()
+        self._frame_event.clear()
+        self._latest_frame = None
+        self._grab_ok = True
+        self._reader_thread = threading.Thread(
+            target=self._reader_loop, name='camera-reader', daemon=True
+        )
+        self._reader_thread.start()
+    
+    def _reader_running(self) -> bool:
+        """Check whether the background reader owns the capture device"""
+        return self._reader_thread is not None and self._reader_thread.is_alive()
+    
+    def _reader_loop(self):
+        """
+        Grab frames continuously so the driver never queues stale ones,
+        decoding only when a consumer has asked for a frame
+        """
+        while not self._stop_evt.is_set():
+            try:
+                self._grab_ok = self.cap.grab()
+                if not self._grab_ok:
+                    self._stop_evt.wait(0.01)  # Avoid spinning on a failing device
+                    continue
+                
+                if self._want_frame.is_set():
+                    self._want_frame.clear()
+                    ret, frame = self.cap.retrieve()
+                    if ret:
+                        with self._frame_lock:
+                            self._latest_frame = frame
+                        self._frame_event.set()
+                        
+            except Exception as e:
+                self.logger.error(f"Camera reader failed: {e}")
+                self._grab_ok = False
+                self._stop_evt.wait(0.01)
+    
+    def async_read(self, require_new: bool = False, timeout: float = 1.0) -> Optional[np.ndarray]:
+        """
+        Read the latest frame from the background reader
+        
+        Args:
+            require_new: Wait for a frame grabbed after this call instead of
+                         returning the last decoded one
+            timeout: Maximum seconds to wait for a new frame
+            
+        Returns:
+            numpy.ndarray: Latest frame (BGR) or None if none arrived in time
+        """
+        if not self._reader_running():
+            self.logger.error("Camera reader not running")
+            return None
+        
+        if require_new or self._latest_frame is None:
+            self._frame_event.clear()
+            self._want_frame.set()
+            if not self._frame_event.wait(timeout):
+                self.logger.warning("Timed out waiting for camera frame")
+                return None
+            self._frame_event.clear()  # Taken, retrieve_frame() waits for the next one
+        
+        with self._frame_lock:
+            return self._latest_frame
+    
+    def request_frame(self):
+        """
+        Ask the background reader to decode the next grabbed frame, so a
+        retrieve_frame() call on a later loop tick finds it without waiting
+        """
+        if self._reader_running():
+            self._frame_event.clear()  # Only a frame decoded after this request counts
+            self._want_frame.set()
+    
     def capture_frame(self) -> Optional[np.ndarray]:
         """
         Capture a single frame from camera
@@ -73,6 +256,9 @@ class CameraCapture:
         if not self.is_initialized or self.cap is None:
             self.logger.error("Camera not initialized")
             return None
+        
+        if self._reader_running():
+            return self.async_read(require_new=True)
             
         try:
             ret, frame = self.cap.read()
@@ -86,31 +272,105 @@ class CameraCapture:
             self.logger.error(f"Frame capture failed: {e}")
             return None
     
-    def frame_to_base64(self, frame: np.ndarray, format: str = 'JPEG') -> Optional[str]:
+    def grab_frame(self) -> bool:
+        """
+        Grab the next frame from the camera without decoding it
+        Call every loop tick to keep the driver queue drained, then
+        retrieve_frame() only when the frame is actually needed
+        
+        Returns:
+            bool: True if a frame was grabbed
+        """
+        if not self.is_initialized or self.cap is None:
+            self.logger.error("Camera not initialized")
+            return False
+        
+        # The background reader is already grabbing every frame
+        if self._reader_running():
+            return self._grab_ok
+            
+        try:
+            if not self.cap.grab():
+                self.logger.warning("Failed to grab frame")
+                return False
+                
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Frame grab failed: {e}")
+            return False
+    
+    def retrieve_frame(self) -> Optional[np.ndarray]:
+        """
+        Decode the most recently grabbed frame
+        With the background reader running this never waits: it returns the
+        frame decoded since the last request_frame(), or None if it has not
+        arrived yet (the next grabbed frame is then decoded for a later call)
+        
+        Returns:
+            numpy.ndarray: Decoded frame (BGR) or None if failed or not ready
+        """
+        if not self.is_initialized or self.cap is None:
+            self.logger.error("Camera not initialized")
+            return None
+        
+        if self._reader_running():
+            if not self._frame_event.is_set():
+                self._want_frame.set()
+                return None
+            self._frame_event.clear()
+            with self._frame_lock:
+                return self._latest_frame
+            
+        try:
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                self.logger.warning("Failed to retrieve frame")
+                return None
+                
+            return frame
+            
+        except Exception as e:
+            self.logger.error(f"Frame retrieve failed: {e}")
+            return None
+    
+    def frame_to_base64(self, frame: np.ndarray, format: str = 'JPEG',
+                        downscale: bool = True) -> Optional[str]:
         """
         Convert OpenCV frame to base64 string for API transmission
         
         Args:
             frame: OpenCV frame (BGR format)
             format: Image format ('JPEG' or 'PNG')
+            downscale: Shrink frames so the longest side fits AI_IMAGE_MAX_SIZE,
+                       keeping the aspect ratio, to cut upload size
             
         Returns:
             str: Base64 encoded image or None if failed
         """
         try:
-            # Convert BGR to RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if downscale:
+                frame = shrink_frame(frame)
             
-            # Convert to PIL Image
-            pil_image = Image.fromarray(rgb_frame)
+            # Encode the BGR frame directly, no RGB copy or PIL round-trip
+            if format.upper() == 'PNG':
+                ok, buffer = cv2.imencode('.png', frame)
+            elif JPEG_ENCODER == 'simplejpeg':
+                buffer = simplejpeg.encode_jpeg(np.ascontiguousarray(frame),
+                                                quality=self._enc_quality, colorspace='BGR')
+                ok = True
+            elif JPEG_ENCODER == 'turbojpeg':
+                buffer = _turbo_jpeg.encode(frame, quality=self._enc_quality, pixel_format=TJPF_BGR)
+                ok = True
+            else:
+                ok, buffer = cv2.imencode('.jpg', frame, self._enc_params)
             
-            # Convert to bytes
-            buffer = io.BytesIO()
-            pil_image.save(buffer, format=format, quality=85)
-            buffer.seek(0)
+            if not ok:
+                self.logger.error(f"{format} encoding failed")
+                return None
             
-            # Encode to base64
-            img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+            # Encode to base64 straight from the encoder's buffer, no bytes copy
+            img_base64 = _b64encode(buffer)
             
             return img_base64
             
@@ -129,11 +389,17 @@ class CameraCapture:
             PIL.Image: Converted image or None if failed
         """
         try:
-            # Convert BGR to RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            # Convert BGR to RGB into the reused buffer. cvtColor's SIMD kernel is
+            # bandwidth bound already, a hand-written numba prange loop was ~6x slower
+            if self._rgb_buf is None or self._rgb_buf.shape != frame.shape:
+                self._rgb_buf = np.empty(frame.shape, dtype=np.uint8)
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
             
-            # Convert to PIL Image
-            pil_image = Image.fromarray(rgb_frame)
+            # Wrap the buffer directly, skipping the array interface round-trip.
+            # Pillow copies RGB data into its own storage, so the image stays
+            # valid when the buffer is overwritten by the next conversion
+            height, width = rgb_frame.shape[:2]
+            pil_image = Image.frombuffer('RGB', (width, height), rgb_frame, 'raw', 'RGB', 0, 1)
             
             return pil_image
             
@@ -141,6 +407,20 @@ class CameraCapture:
             self.logger.error(f"PIL conversion failed: {e}")
             return None
     
+    def frame_to_bytes(self, frame: np.ndarray) -> memoryview:
+        """
+        Expose a frame's pixel data as raw bytes without copying
+        For encoders that take a buffer directly (turbojpeg, PyAV) instead of a PIL image
+        
+        Args:
+            frame: OpenCV frame (BGR format)
+            
+        Returns:
+            memoryview: Flat byte view of the frame, row-major BGR
+        """
+        # Only non-contiguous frames (e.g. crops) are copied, capture output is contiguous
+        return memoryview(np.ascontiguousarray(frame)).cast('B')
+    
     def get_frame_info(self) -> dict:
         """
         Get current camera frame information
@@ -172,6 +452,12 @@ class CameraCapture:
         Release camera resources
         """
         try:
+            # Stop the reader before the device goes away under it
+            self._stop_evt.set()
+            if self._reader_thread is not None:
+                self._reader_thread.join(timeout=1.0)
+                self._reader_thread = None
+            
             if self.cap is not None:
                 self.cap.release()
                 self.cap = None
@@ -183,7 +469,6 @@ class CameraCapture:
             self.logger.error(f"Camera release failed: {e}")
         finally:
             # Ensure OpenCV cleanup
-            import cv2
             cv2.destroyAllWindows()
     
     def __enter__(self):
@@ -196,6 +481,117 @@ class CameraCapture:
         self.release()
         return False  # Don't suppress exceptions
 
+class RawMjpegCapture:
+    """
+    V4L2 MJPEG capture that returns the camera's compressed frames as-is
+    For when Gemini is the only consumer: the JPEG bytes go straight to the
+    analyzer or base64 with no decode/re-encode round-trip (Linux, needs linuxpy)
+    """
+    
+    def __init__(self, camera_index: int = CAMERA_INDEX):
+        """
+        Initialize raw MJPEG capture
+        
+        Args:
+            camera_index: Index of camera to use (/dev/video<index>)
+        """
+        self.camera_index = camera_index
+        self.device = None
+        self.capture = None
+        self._frames = None
+        self.is_initialized = False
+        self.logger = logging.getLogger(__name__)
+    
+    def initialize(self) -> bool:
+        """
+        Open the V4L2 device and start streaming MJPEG
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not LINUXPY_AVAILABLE:
+            self.logger.error("Raw MJPEG capture requires linuxpy (pip install linuxpy)")
+            return False
+        
+        try:
+            self.device = Device.from_id(self.camera_index)
+            self.device.open()
+            
+            self.capture = VideoCapture(self.device, size=CAMERA_BUFFER_SIZE)
+            self.capture.set_format(FRAME_WIDTH, FRAME_HEIGHT, 'MJPG')
+            self.capture.set_fps(FPS)
+            self.capture.open()
+            self._frames = iter(self.capture)
+            
+            self.is_initialized = True
+            self.logger.info(f"Raw MJPEG camera {self.camera_index} initialized successfully")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Raw MJPEG camera initialization failed: {e}")
+            self.release()
+            return False
+    
+    def capture_jpeg_bytes(self) -> Optional[bytes]:
+        """
+        Capture the next compressed frame
+        
+        Returns:
+            bytes: JPEG data exactly as sent by the camera, or None if failed
+        """
+        if not self.is_initialized:
+            self.logger.error("Camera not initialized")
+            return None
+        
+        try:
+            return next(self._frames).data
+            
+        except Exception as e:
+            self.logger.error(f"MJPEG capture failed: {e}")
+            return None
+    
+    @staticmethod
+    def jpeg_to_base64(jpeg: bytes) -> str:
+        """
+        Encode captured JPEG bytes to base64 for API transmission
+        
+        Args:
+            jpeg: JPEG data from capture_jpeg_bytes()
+            
+        Returns:
+            str: Base64 encoded image
+        """
+        return _b64encode(jpeg)
+    
+    def release(self):
+        """
+        Stop streaming and close the device
+        """
+        try:
+            if self.capture is not None:
+                self.capture.close()
+                self.capture = None
+            if self.device is not None:
+                self.device.close()
+                self.device = None
+                self.logger.info("Raw MJPEG camera released successfully")
+                
+        except Exception as e:
+            self.logger.error(f"Raw MJPEG camera release failed: {e}")
+        finally:
+            self._frames = None
+            self.is_initialized = False
+    
+    def __enter__(self):
+        """Context manager entry"""
+        self.initialize()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit"""
+        self.release()
+        return False  # Don't suppress exceptions
+
 # Utility functions for camera testing
 def test_camera_capture():
     """
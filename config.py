@@ -2,6 +2,7 @@
 Configuration file for Unitree G1 Autonomous Mode
 """
 import os
+import numpy as np
 from typing import Dict, Any
 
 # Gemini API Configuration
@@ -33,19 +34,43 @@ MAX_FORWARD_SPEED = 0.3  # m/s
 MAX_SIDE_SPEED = 0.2     # m/s  
 MAX_YAW_SPEED = 0.3      # rad/s
 MIN_OBSTACLE_DISTANCE = 2.0  # meters
+SAFETY_CHECK_TTL = 0.05  # seconds a safety check result is reused between state updates
 
 # Camera Configuration
 CAMERA_INDEX = 0  # Front camera
 FRAME_WIDTH = 640
 FRAME_HEIGHT = 480
 FPS = 30
+CAMERA_BUFFER_SIZE = 1  # driver frame queue depth, 1 keeps only the newest frame
+CAMERA_FOURCC = 'MJPG'  # compressed USB stream, decoded by libjpeg-turbo on retrieve
 
 # Control Loop Configuration
 LOOP_RATE = 10  # Hz (0.1 second intervals)
 AI_QUERY_INTERVAL = 1.0  # seconds between AI queries
+AI_BATCH_SIZE = 3  # frames sampled across each AI query interval and sent together
+AI_QUERY_BACKOFF_MAX = 4  # static scenes stretch the query interval up to this multiple
+AI_SCENE_CHANGE_THRESHOLD = 5.0  # mean grayscale difference (0-255) that counts as a scene change
+AI_REQUEST_TIMEOUT = 30.0  # seconds before an in-flight AI request is abandoned
+
+# Gemini API Rate Limiting (token bucket)
+AI_RATE_LIMIT_CAPACITY = 5  # max burst of back-to-back requests
+AI_RATE_LIMIT_REFILL_RATE = 1.0  # tokens per second (long-run request rate)
+
+# Gemini Circuit Breaker
+AI_CIRCUIT_FAIL_THRESHOLD = 3  # consecutive failed requests before requests are suspended
+AI_CIRCUIT_COOLDOWN = 10.0  # seconds requests stay suspended before retrying
+
+# Gemini Upload Encoding
+AI_IMAGE_MAX_SIZE = 512  # longest side (px) of frames sent to Gemini
+AI_JPEG_QUALITY = 80
+
+# Gemini Response Cache
+AI_CACHE_SIZE = 128  # analyses kept, keyed by perceptual image hash + prompt
+AI_CACHE_TTL = 5.0  # seconds a cached analysis may be replayed before the scene is asked again
+AI_HASH_MIN_CONTRAST = 4.0  # gray level std below which a frame has no texture to hash (never cached)
 
 # Movement Commands
-MOVEMENT_COMMANDS = {
+_MOVEMENT_SPEEDS = {
     "move_forward": {"forward": MAX_FORWARD_SPEED, "side": 0, "yaw": 0},
     "move_backward": {"forward": -MAX_FORWARD_SPEED/2, "side": 0, "yaw": 0},
     "turn_left": {"forward": 0, "side": 0, "yaw": MAX_YAW_SPEED},
@@ -55,6 +80,16 @@ MOVEMENT_COMMANDS = {
     "stop": {"forward": 0, "side": 0, "yaw": 0}
 }
 
+# Commands as read-only (forward, side, yaw) vectors, clamped against MAX_SPEEDS
+MAX_SPEEDS = np.array([MAX_FORWARD_SPEED, MAX_SIDE_SPEED, MAX_YAW_SPEED], dtype=np.float32)
+MAX_SPEEDS.setflags(write=False)
+MOVEMENT_COMMANDS: Dict[str, np.ndarray] = {}
+for _name, _speeds in _MOVEMENT_SPEEDS.items():
+    MOVEMENT_COMMANDS[_name] = np.array(
+        [_speeds["forward"], _speeds["side"], _speeds["yaw"]], dtype=np.float32
+    )
+    MOVEMENT_COMMANDS[_name].setflags(write=False)
+
 # AI Prompt Template
 AI_PROMPT = """
 Analyze this image from a humanoid robot's front camera. You are controlling a Unitree G1 robot.
@@ -7,19 +7,37 @@ Handles installation of all required packages and SDK components
 import subprocess
 import sys
 import os
+import platform
 import logging
 
-def run_command(command, description=""):
+# (pip requirement, description) installed from wheels together in one pip run
+DEPENDENCIES = [
+    ("google-generativeai", "Google Gemini API"),
+    ("opencv-python", "OpenCV"),
+    ("numpy", "NumPy"),
+    ("Pillow", "PIL/Pillow"),
+]
+
+# Robot SDK packages, installed one pip run each and in this order (the SDK
+# needs Cyclone DDS). Cyclone DDS often builds from source, so a failure here
+# must not keep the packages above from installing
+SDK_DEPENDENCIES = [
+    ("cyclonedds==0.10.2", "Cyclone DDS"),
+    ("unitree_sdk2py", "Unitree SDK"),
+]
+
+def run_command(command, description="", env=None):
     """
-    Run a shell command and handle errors
+    Run a command (argument list, no shell) and handle errors
     
     Args:
-        command: Command to execute
+        command: Command and arguments to execute
         description: Description for logging
+        env: Environment for the command (inherits the current one if None)
     """
     try:
         print(f"Installing: {description}")
-        result = subprocess.run(command, shell=True, check=True, 
+        result = subprocess.run(command, check=True, env=env,
                               capture_output=True, text=True)
         print(f"✓ Success: {description}")
         return True
@@ -28,12 +46,41 @@ def run_command(command, description=""):
         print(f"Error: {e.stderr}")
         return False
 
-def install_dependencies():
+def install_pillow_simd():
+    """
+    Replace stock Pillow with Pillow-SIMD, an API compatible fork with
+    AVX2 JPEG and resize loops. Built from source, so a C compiler and
+    the libjpeg-turbo headers must be installed
+    
+    Returns:
+        bool: True if Pillow-SIMD was installed
+    """
+    if platform.machine().lower() not in ("x86_64", "amd64"):
+        print(f"Skipping Pillow-SIMD: AVX2 build needs an x86-64 CPU ({platform.machine()})")
+        return False
+    
+    pip = [sys.executable, "-m", "pip"]
+    # The two packages share the PIL namespace, so stock Pillow has to go first
+    if not run_command(pip + ["uninstall", "-y", "Pillow"], "Removing stock Pillow"):
+        return False
+    
+    env = dict(os.environ, CC="cc -mavx2")
+    return run_command(
+        pip + ["install", "--no-input", "--disable-pip-version-check",
+               "--force-reinstall", "pillow-simd"],
+        "Pillow-SIMD", env=env
+    )
+
+def install_dependencies(pillow_simd=False):
     """
     Install all required dependencies
+    
+    Args:
+        pillow_simd: Replace Pillow with Pillow-SIMD after the main install
     """
-    os.environ["CYCLONEDDS_HOME"] = "/Users/stephonbridges/G1SA/cyclonedds/install"
-    os.environ["CPATH"] = "/Users/stephonbridges/G1SA/cyclonedds/src/core/include"
+    # Defaults for the Cyclone DDS source build, set CYCLONEDDS_HOME/CPATH to override
+    os.environ.setdefault("CYCLONEDDS_HOME", "/Users/stephonbridges/G1SA/cyclonedds/install")
+    os.environ.setdefault("CPATH", "/Users/stephonbridges/G1SA/cyclonedds/src/core/include")
     print("=== Unitree G1 Autonomous Mode - Dependency Installation ===")
     
     # Check Python version
@@ -43,26 +90,34 @@ def install_dependencies():
     
     print(f"Python version: {sys.version}")
     
-    # Install core dependencies
-    dependencies = [
-        ("source venv/bin/activate && python3 -m pip install --upgrade pip", "Upgrading pip"),
-        ("source venv/bin/activate && python3 -m pip install unitree_sdk2py", "Unitree SDK"),
-        ("source venv/bin/activate && python3 -m pip install google-generativeai", "Google Gemini API"),
-        ("source venv/bin/activate && python3 -m pip install opencv-python", "OpenCV"),
-        ("source venv/bin/activate && python3 -m pip install numpy", "NumPy"),
-        ("source venv/bin/activate && python3 -m pip install Pillow", "PIL/Pillow"),
-        ("source venv/bin/activate && python3 -m pip install cyclonedds==0.10.2", "Cyclone DDS"),
+    # Install into the interpreter running this script (run it with the venv's
+    # python). Only pip itself is upgraded, installed packages are left as they are
+    pip = [sys.executable, "-m", "pip", "install", "--no-input", "--disable-pip-version-check"]
+    steps = [
+        (pip + ["--upgrade", "pip"], "Upgrading pip"),
+        # Wheel-only packages share one run and one dependency resolution
+        (pip + [package for package, _ in DEPENDENCIES],
+         ", ".join(name for _, name in DEPENDENCIES)),
+        *((pip + [package], name) for package, name in SDK_DEPENDENCIES),
     ]
     
     success_count = 0
-    for command, description in dependencies:
+    for command, description in steps:
         if run_command(command, description):
             success_count += 1
+    success = success_count == len(steps)
+    
+    if pillow_simd and not install_pillow_simd():
+        print("Pillow-SIMD not installed, keeping stock Pillow")
+        # A failed build after the uninstall would leave PIL missing
+        if not run_command(pip + ["Pillow"], "PIL/Pillow"):
+            success = False
     
     print(f"\n=== Installation Summary ===")
-    print(f"Successful: {success_count}/{len(dependencies)}")
+    print(f"Python: {sys.executable}")
+    print(f"Successful: {success_count}/{len(steps)}")
     
-    if success_count == len(dependencies):
+    if success:
         print("✓ All dependencies installed successfully!")
         print("\nNext steps:")
         print("1. Set your GEMINI_API_KEY environment variable")
@@ -75,4 +130,4 @@ def install_dependencies():
         return False
 
 if __name__ == "__main__":
-    install_dependencies()
+    install_dependencies(pillow_simd="--pillow-simd" in sys.argv[1:])
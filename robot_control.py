@@ -5,8 +5,11 @@ Handles SDK communication and robot movement commands
 
 import time
 import logging
-from typing import Dict, Tuple
-from dataclasses import dataclass
+import threading
+import numpy as np
+from types import MappingProxyType
+from typing import Callable, Dict, Mapping, Optional
+from dataclasses import dataclass, field
 
 try:
     from unitree_sdk2py.core.channel import ChannelFactoryInitialize, ChannelWriter, ChannelReader
@@ -54,22 +57,62 @@ except ImportError as e:
     
     logging.warning(f"Unitree SDK not available ({e}), using simulation mode")
 
-from config import (
-    MAX_FORWARD_SPEED, MAX_SIDE_SPEED, MAX_YAW_SPEED, 
-    MOVEMENT_COMMANDS
+from config import MAX_SPEEDS, MOVEMENT_COMMANDS, SAFETY_CHECK_TTL
+
+# Safety conditions as bits of one mask, all set means safe to move
+_SAFETY_BITS = (
+    ('battery_ok', 1),
+    ('temperature_ok', 2),
+    ('orientation_ok', 4),
+    ('recent_update', 8),
+    ('not_emergency', 16),
 )
+_SAFETY_ALL = 0x1F
+
+# AI action -> prebuilt handler with its command vector bound at import time
+_ACTIONS: Dict[str, Callable[['RobotController'], bool]] = {
+    name: (lambda controller, command=command: controller.move_vector(command))
+    for name, command in MOVEMENT_COMMANDS.items()
+}
 
 @dataclass
 class RobotState:
     """Robot state information"""
-    position: Tuple[float, float, float] = (0.0, 0.0, 0.0)  # x, y, z
-    orientation: Tuple[float, float, float] = (0.0, 0.0, 0.0)  # roll, pitch, yaw
-    velocity: Tuple[float, float, float] = (0.0, 0.0, 0.0)  # vx, vy, vyaw
+    # Position (x, y, z), orientation (roll, pitch, yaw) and velocity (vx, vy, vyaw)
+    # in one buffer, updated in place and exposed as views below
+    state: np.ndarray = field(default_factory=lambda: np.zeros(9, dtype=np.float32))
     battery_level: float = 100.0
     temperature: float = 25.0
     is_standing: bool = False
     is_moving: bool = False
-    last_update: float = 0.0
+    last_update: float = 0.0  # time.monotonic()
+    
+    @property
+    def position(self) -> np.ndarray:
+        """x, y, z view of the state buffer"""
+        return self.state[0:3]
+    
+    @position.setter
+    def position(self, value):
+        self.state[0:3] = value
+    
+    @property
+    def orientation(self) -> np.ndarray:
+        """roll, pitch, yaw view of the state buffer"""
+        return self.state[3:6]
+    
+    @orientation.setter
+    def orientation(self, value):
+        self.state[3:6] = value
+    
+    @property
+    def velocity(self) -> np.ndarray:
+        """vx, vy, vyaw view of the state buffer"""
+        return self.state[6:9]
+    
+    @velocity.setter
+    def velocity(self, value):
+        self.state[6:9] = value
 
 class RobotController:
     """
@@ -91,7 +134,16 @@ class RobotController:
         # Robot state
         self.robot_state = RobotState()
         self.emergency_stop = False
-        self.last_command_time = 0.0
+        self.last_command_time = 0.0  # time.monotonic() of the last command sent
+        
+        # Last safety check result, reused until it expires or the state changes
+        self._safety_mask: Optional[int] = None
+        self._safety_mask_t = 0.0
+        
+        # Dict form of the mask, updated in place and handed out as a read-only view
+        self._safety_state = {condition: True for condition, _ in _SAFETY_BITS}
+        self._safety_state_mask = _SAFETY_ALL
+        self._safety_view = MappingProxyType(self._safety_state)
         
         # SDK objects
         self.cmd_writer = None
@@ -99,12 +151,17 @@ class RobotController:
         self.low_cmd = None
         self.low_state = None
         
-        # Safety limits
-        self.max_speeds = {
-            'forward': MAX_FORWARD_SPEED,
-            'side': MAX_SIDE_SPEED, 
-            'yaw': MAX_YAW_SPEED
-        }
+        # Safety limits as (forward, side, yaw) vectors
+        self.max_speeds = MAX_SPEEDS
+        self._min_speeds = -MAX_SPEEDS
+        self._cmd_buf = np.zeros(3, dtype=np.float32)  # Clamped command scratch buffer
+        
+        # Single-slot hand-off to the DDS writer thread, newer commands replace unsent ones
+        self._cmd_slot = np.zeros(3, dtype=np.float32)
+        self._cmd_pending = False
+        self._cmd_cond = threading.Condition()
+        self._writer_thread: Optional[threading.Thread] = None
+        self._writer_stop = False
         
     def initialize(self) -> bool:
         """
@@ -129,6 +186,7 @@ class RobotController:
             # Initialize DDS communication
             self.cmd_writer = ChannelWriter("rt/lowcmd", LowCmd_)
             self.state_reader = ChannelReader("rt/lowstate", LowState_)
+            self._start_writer()
             
             # Initialize command
             self.low_cmd.head[0] = 0xFE
@@ -163,7 +221,8 @@ class RobotController:
         try:
             if self.simulation_mode:
                 # Update simulation state
-                self.robot_state.last_update = time.time()
+                self.robot_state.last_update = time.monotonic()
+                self._safety_mask = None
                 return True
             
             # Read actual robot state
@@ -171,26 +230,17 @@ class RobotController:
                 self.low_state = self.state_reader.read()
                 
                 if self.low_state:
-                    # Update position and orientation from IMU
+                    # Update orientation (roll, pitch, yaw) and velocity from IMU in place
                     imu = self.low_state.imu_state
-                    self.robot_state.orientation = (
-                        imu.rpy[0],  # roll
-                        imu.rpy[1],  # pitch  
-                        imu.rpy[2]   # yaw
-                    )
-                    
-                    # Update velocity
-                    self.robot_state.velocity = (
-                        imu.gyroscope[0],
-                        imu.gyroscope[1], 
-                        imu.gyroscope[2]
-                    )
+                    self.robot_state.state[3:6] = imu.rpy[:3]
+                    self.robot_state.state[6:9] = imu.gyroscope[:3]
                     
                     # Update battery and temperature
                     self.robot_state.battery_level = self.low_state.power_v * 10  # Rough estimate
                     self.robot_state.temperature = self.low_state.motor_state[0].temperature
                     
-                    self.robot_state.last_update = time.time()
+                    self.robot_state.last_update = time.monotonic()
+                    self._safety_mask = None
                     return True
             
             return False
@@ -208,6 +258,19 @@ class RobotController:
             side_speed: Side velocity (m/s) 
             yaw_speed: Yaw angular velocity (rad/s)
             
+        Returns:
+            bool: True if command sent successfully
+        """
+        self._cmd_buf[:] = (forward_speed, side_speed, yaw_speed)
+        return self.move_vector(self._cmd_buf)
+    
+    def move_vector(self, command: np.ndarray) -> bool:
+        """
+        Move robot with a (forward, side, yaw) velocity vector
+        
+        Args:
+            command: Velocities in m/s, m/s and rad/s (not modified)
+            
         Returns:
             bool: True if command sent successfully
         """
@@ -215,36 +278,26 @@ class RobotController:
             self.logger.warning("Emergency stop active, ignoring move command")
             return False
         
-        # Apply safety limits
-        forward_speed = max(-self.max_speeds['forward'], 
-                           min(self.max_speeds['forward'], forward_speed))
-        side_speed = max(-self.max_speeds['side'],
-                        min(self.max_speeds['side'], side_speed))
-        yaw_speed = max(-self.max_speeds['yaw'],
-                       min(self.max_speeds['yaw'], yaw_speed))
+        # Apply safety limits in one pass, then unpack for the SDK
+        np.clip(command, self._min_speeds, self.max_speeds, out=self._cmd_buf)
+        forward_speed, side_speed, yaw_speed = self._cmd_buf.tolist()
         
         try:
             if self.simulation_mode:
-                self.logger.info(f"SIM: VelocityMove({forward_speed:.2f}, {side_speed:.2f}, {yaw_speed:.2f})")
+                self.logger.info("SIM: VelocityMove(%.2f, %.2f, %.2f)", forward_speed, side_speed, yaw_speed)
                 self.robot_state.is_moving = abs(forward_speed) > 0.01 or abs(side_speed) > 0.01 or abs(yaw_speed) > 0.01
                 return True
             
             # Send actual command to robot
             if self.cmd_writer and self.low_cmd:
-                # Set velocity commands (this is a simplified version)
-                # In actual implementation, you would need to convert 
-                # high-level velocities to joint commands
-                
-                # For now, we'll use a placeholder implementation
-                # that would need to be replaced with actual SDK calls
-                self.logger.info(f"CMD: VelocityMove({forward_speed:.2f}, {side_speed:.2f}, {yaw_speed:.2f})")
+                self.logger.info("CMD: VelocityMove(%.2f, %.2f, %.2f)", forward_speed, side_speed, yaw_speed)
                 
                 # Update command timestamp
-                self.last_command_time = time.time()
+                self.last_command_time = time.monotonic()
                 self.robot_state.is_moving = True
                 
-                # Write command
-                self.cmd_writer.write(self.low_cmd)
+                # Hand off to the writer thread so DDS latency never stalls the loop
+                self._post_command(self._cmd_buf)
                 return True
             
             return False
@@ -253,6 +306,77 @@ class RobotController:
             self.logger.error(f"Velocity move failed: {e}")
             return False
     
+    def _start_writer(self):
+        """
+        Start the DDS writer thread
+        """
+        self._writer_stop = False
+        self._writer_thread = threading.Thread(
+            target=self._writer_loop, name='dds-writer', daemon=True
+        )
+        self._writer_thread.start()
+    
+    def _stop_writer(self, timeout: float = 1.0):
+        """
+        Stop the DDS writer thread after it sends any pending command
+        
+        Args:
+            timeout: Maximum seconds to wait for the thread to finish
+        """
+        if self._writer_thread is None:
+            return
+        
+        with self._cmd_cond:
+            self._writer_stop = True
+            self._cmd_cond.notify()
+        self._writer_thread.join(timeout)
+        self._writer_thread = None
+    
+    def _post_command(self, command: np.ndarray):
+        """
+        Post a command for the writer thread, replacing any unsent one
+        
+        Args:
+            command: Clamped (forward, side, yaw) velocities
+        """
+        with self._cmd_cond:
+            self._cmd_slot[:] = command
+            self._cmd_pending = True
+            self._cmd_cond.notify()
+    
+    def _writer_loop(self):
+        """
+        Write the latest command to DDS whenever a new one is posted
+        """
+        command = np.zeros(3, dtype=np.float32)
+        while True:
+            with self._cmd_cond:
+                self._cmd_cond.wait_for(lambda: self._cmd_pending or self._writer_stop)
+                if not self._cmd_pending:
+                    return  # Stopped with nothing left to send
+                command[:] = self._cmd_slot
+                self._cmd_pending = False
+            
+            try:
+                self._write_command(command)
+            except Exception as e:
+                self.logger.error(f"Command write failed: {e}")
+    
+    def _write_command(self, command: np.ndarray):
+        """
+        Serialize and write a velocity command to the robot
+        
+        Args:
+            command: Clamped (forward, side, yaw) velocities
+        """
+        # Set velocity commands (this is a simplified version)
+        # In actual implementation, you would need to convert 
+        # high-level velocities to joint commands
+        
+        # For now, we'll use a placeholder implementation
+        # that would need to be replaced with actual SDK calls
+        self.cmd_writer.write(self.low_cmd)
+    
     def stop_move(self) -> bool:
         """
         Stop all robot movement
@@ -272,12 +396,12 @@ class RobotController:
         Returns:
             bool: True if command executed successfully
         """
-        if action not in MOVEMENT_COMMANDS:
-            self.logger.warning(f"Unknown action: {action}")
+        handler = _ACTIONS.get(action)
+        if handler is None:
+            self.logger.warning("Unknown action: %s", action)
             return self.stop_move()
         
-        cmd = MOVEMENT_COMMANDS[action]
-        return self.velocity_move(cmd['forward'], cmd['side'], cmd['yaw'])
+        return handler(self)
     
     def set_emergency_stop(self, stop: bool = True):
         """
@@ -287,34 +411,57 @@ class RobotController:
             stop: True to activate emergency stop, False to deactivate
         """
         self.emergency_stop = stop
+        self._safety_mask = None
         if stop:
             self.stop_move()
             self.logger.warning("EMERGENCY STOP ACTIVATED")
         else:
             self.logger.info("Emergency stop deactivated")
     
-    def check_safety_conditions(self) -> Dict[str, bool]:
+    def _check_safety_mask(self) -> int:
         """
-        Check various safety conditions
+        Evaluate all safety conditions into a bitmask (see _SAFETY_BITS)
         
         Returns:
-            dict: Safety condition status
-        """
-        conditions = {
-            'battery_ok': self.robot_state.battery_level > 20.0,
-            'temperature_ok': self.robot_state.temperature < 80.0,
-            'orientation_ok': abs(self.robot_state.orientation[0]) < 0.5 and 
-                            abs(self.robot_state.orientation[1]) < 0.5,
-            'recent_update': (time.time() - self.robot_state.last_update) < 1.0,
-            'not_emergency': not self.emergency_stop
-        }
+            int: Mask with a bit set for every condition that holds
+        """
+        now = time.monotonic()
+        if self._safety_mask is not None and now - self._safety_mask_t < SAFETY_CHECK_TTL:
+            return self._safety_mask
+        
+        state = self.robot_state
+        mask = (
+            (state.battery_level > 20.0)
+            | (state.temperature < 80.0) << 1
+            | bool(np.abs(state.state[3:5]).max() < 0.5) << 2  # roll, pitch
+            | ((now - state.last_update) < 1.0) << 3
+            | (not self.emergency_stop) << 4
+        )
         
-        # Log any failing conditions
-        for condition, status in conditions.items():
-            if not status:
-                self.logger.warning(f"Safety condition failed: {condition}")
+        # Log any failing conditions, the safe path is a single compare
+        if mask != _SAFETY_ALL:
+            for condition, bit in _SAFETY_BITS:
+                if not mask & bit:
+                    self.logger.warning("Safety condition failed: %s", condition)
         
-        return conditions
+        self._safety_mask = mask
+        self._safety_mask_t = now
+        return mask
+    
+    def check_safety_conditions(self) -> Mapping[str, bool]:
+        """
+        Check various safety conditions
+        
+        Returns:
+            Mapping: Read-only safety condition status, the same view is updated
+                     in place on every check (copy it with dict() to keep a snapshot)
+        """
+        mask = self._check_safety_mask()
+        if mask != self._safety_state_mask:
+            for condition, bit in _SAFETY_BITS:
+                self._safety_state[condition] = bool(mask & bit)
+            self._safety_state_mask = mask
+        return self._safety_view
     
     def is_safe_to_move(self) -> bool:
         """
@@ -323,8 +470,7 @@ class RobotController:
         Returns:
             bool: True if safe to move
         """
-        conditions = self.check_safety_conditions()
-        return all(conditions.values())
+        return self._check_safety_mask() == _SAFETY_ALL
     
     def get_robot_info(self) -> Dict:
         """
@@ -338,7 +484,7 @@ class RobotController:
             'is_initialized': self.is_initialized,
             'simulation_mode': self.simulation_mode,
             'emergency_stop': self.emergency_stop,
-            'safety_conditions': self.check_safety_conditions(),
+            'safety_conditions': dict(self.check_safety_conditions()),
             'last_command_time': self.last_command_time
         }
     
@@ -350,6 +496,9 @@ class RobotController:
             # Stop all movement
             self.stop_move()
             
+            # Make sure the stop command is written before the writer exits
+            self._stop_writer()
+            
             # Wait for stop command to be processed
             time.sleep(0.1)
             
@@ -5,21 +5,62 @@ Runs comprehensive tests on all system components
 """
 
 import sys
-import os
+import io
+import base64
 import logging
+import platform
 import unittest
+import warnings
+from collections.abc import Mapping
+from dataclasses import asdict
 from unittest.mock import Mock, patch
+import threading
 import time
 
-# Add current directory to path for imports
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import cv2
+import numpy as np
+import PIL
+from PIL import Image
+
+import camera_module
+from camera_module import CameraCapture
+from ai_vision import GeminiVisionAnalyzer, Decision, TokenBucket, perceptual_hash
+from robot_control import RobotController
+from autonomous_mode import AutonomousRobot
+from config import AI_BATCH_SIZE, MAX_SPEEDS, MOVEMENT_COMMANDS
+
+# Shared read-only camera frame, conversions only read it
+_TEST_FRAME = np.zeros((480, 640, 3), dtype=np.uint8)
+_TEST_FRAME.setflags(write=False)
+
+# Model replies covering the structured format and the free-text fallback
+_TEST_RESPONSES = (
+    "ACTION: move_forward REASON: Path is clear ahead",
+    "ACTION: turn_left REASON: Obstacle detected on right",
+    "ACTION: stop REASON: Person detected in path",
+    "The robot should move forward because the path looks clear.",
+    "I recommend turning left to avoid the obstacle.",
+)
+
+# Basic movement commands
+_TEST_COMMANDS = ('move_forward', 'turn_left', 'turn_right', 'stop')
 
 class TestCameraModule(unittest.TestCase):
     """Test camera capture functionality"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Warn if frame_to_pil runs on stock Pillow instead of Pillow-SIMD"""
+        # Pillow-SIMD releases carry a .postN suffix on the Pillow version; the
+        # installer only builds it on x86-64, so other machines are not nagged
+        if platform.machine().lower() not in ("x86_64", "amd64"):
+            return
+        if 'post' not in PIL.__version__ and 'simd' not in PIL.__version__.lower():
+            warnings.warn(f"Pillow {PIL.__version__} is not Pillow-SIMD, install it with "
+                          "'python install_dependencies.py --pillow-simd' for faster conversions")
+    
     def setUp(self):
         """Setup test environment"""
-        from camera_module import CameraCapture
         self.camera = CameraCapture()
     
     def test_camera_initialization(self):
@@ -32,61 +73,297 @@ class TestCameraModule(unittest.TestCase):
     
     def test_frame_conversion_methods(self):
         """Test image conversion methods"""
-        import numpy as np
-        from PIL import Image
-        
-        # Create a test frame
-        test_frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+        test_frame = _TEST_FRAME
         
         # Test PIL conversion
         pil_image = self.camera.frame_to_pil(test_frame)
         if pil_image:  # Only test if conversion succeeded
             self.assertIsInstance(pil_image, Image.Image)
             self.assertEqual(pil_image.size, (640, 480))
+            
+            # Converting another frame reuses the RGB buffer but not the image
+            pixel = pil_image.getpixel((0, 0))
+            self.camera.frame_to_pil(255 - test_frame)
+            self.assertEqual(pil_image.getpixel((0, 0)), pixel)
         
         # Test base64 conversion
         base64_str = self.camera.frame_to_base64(test_frame)
         if base64_str:  # Only test if conversion succeeded
             self.assertIsInstance(base64_str, str)
             self.assertGreater(len(base64_str), 0)
+            
+            # Frame is downscaled before encoding
+            data = base64.b64decode(base64_str)
+            self.assertEqual(data[:3], b'\xff\xd8\xff')  # JPEG magic
+            jpeg = np.frombuffer(data, dtype=np.uint8)
+            self.assertEqual(cv2.imdecode(jpeg, cv2.IMREAD_COLOR).shape, (384, 512, 3))
+
+    def test_frame_to_bytes_zerocopy(self):
+        """Test frames are exposed as raw bytes without a copy"""
+        mv = self.camera.frame_to_bytes(_TEST_FRAME)
+        self.assertEqual(mv.nbytes, _TEST_FRAME.nbytes)
+        self.assertEqual(mv.itemsize, 1)
+        self.assertTrue(np.shares_memory(np.frombuffer(mv, dtype=np.uint8), _TEST_FRAME))
+    
+    def test_frame_to_jpeg_backend(self):
+        """Test each JPEG encoder backend is used when selected and yields a valid JPEG"""
+        imencode = cv2.imencode
+        
+        def stand_in(frame, **kwargs):
+            """Native encoder stand-in where the library is not installed"""
+            return imencode('.jpg', frame)[1]
+        
+        simplejpeg = Mock()
+        simplejpeg.encode_jpeg.side_effect = (camera_module.simplejpeg.encode_jpeg
+                                              if camera_module.SIMPLEJPEG_AVAILABLE else stand_in)
+        turbo_jpeg = Mock()
+        turbo_jpeg.encode.side_effect = (camera_module._turbo_jpeg.encode
+                                         if camera_module.TURBOJPEG_AVAILABLE else stand_in)
+        encoders = {
+            'simplejpeg': simplejpeg.encode_jpeg,
+            'turbojpeg': turbo_jpeg.encode,
+            'opencv': Mock(side_effect=imencode),
+        }
+        
+        with patch.object(camera_module, 'simplejpeg', simplejpeg, create=True), \
+             patch.object(camera_module, '_turbo_jpeg', turbo_jpeg, create=True), \
+             patch.object(camera_module, 'TJPF_BGR', getattr(camera_module, 'TJPF_BGR', 1), create=True), \
+             patch.object(camera_module.cv2, 'imencode', encoders['opencv']):
+            for name, encode in encoders.items():
+                with self.subTest(encoder=name), patch.object(camera_module, 'JPEG_ENCODER', name):
+                    for mock in encoders.values():
+                        mock.reset_mock()
+                    data = base64.b64decode(self.camera.frame_to_base64(_TEST_FRAME))
+                    
+                    # Only the selected encoder runs, on the downscaled BGR frame
+                    encode.assert_called_once()
+                    frame = encode.call_args[0][1 if name == 'opencv' else 0]  # imencode(ext, frame)
+                    self.assertEqual(frame.shape, (384, 512, 3))
+                    for other in encoders.values():
+                        if other is not encode:
+                            other.assert_not_called()
+                    
+                    self.assertEqual(data[:3], b'\xff\xd8\xff')  # JPEG magic
+                    decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                    self.assertEqual(decoded.shape, (384, 512, 3))
+
+    def test_grab_and_retrieve(self):
+        """Test frames are grabbed without decoding and retrieved on demand"""
+        self.assertFalse(self.camera.grab_frame())  # Not initialized
+        
+        self.camera.cap = Mock()
+        self.camera.cap.grab.return_value = True
+        self.camera.cap.retrieve.return_value = (True, _TEST_FRAME)
+        self.camera.is_initialized = True
+        
+        for _ in range(3):
+            self.assertTrue(self.camera.grab_frame())
+        frame = self.camera.retrieve_frame()
+        
+        self.assertEqual(frame.shape, (480, 640, 3))
+        self.assertEqual(self.camera.cap.grab.call_count, 3)
+        self.assertEqual(self.camera.cap.retrieve.call_count, 1)
+        self.camera.cap.read.assert_not_called()
+
+    def test_background_reader(self):
+        """Test the reader thread drains the camera and decodes on request"""
+        def grab():
+            time.sleep(0.001)  # Real grab() blocks until the next frame
+            return True
+        
+        self.camera.cap = Mock()
+        self.camera.cap.grab.side_effect = grab
+        self.camera.cap.retrieve.return_value = (True, _TEST_FRAME)
+        self.camera.is_initialized = True
+        self.camera._start_reader()
+        try:
+            frame = self.camera.async_read(require_new=True)
+            self.assertEqual(frame.shape, (480, 640, 3))
+            self.assertIs(self.camera.async_read(), frame)  # Latest frame, no new decode
+            self.assertTrue(self.camera.grab_frame())
+            
+            # retrieve_frame never waits, a frame requested earlier is ready
+            self.assertIsNone(self.camera.retrieve_frame())
+            self.camera.request_frame()
+            self.assertTrue(self.camera._frame_event.wait(1.0))
+            self.assertIs(self.camera.retrieve_frame(), _TEST_FRAME)
+            self.assertIsNone(self.camera.retrieve_frame())  # Already taken
+        finally:
+            self.camera._stop_evt.set()
+            self.camera._reader_thread.join(timeout=1.0)
+        
+        self.assertFalse(self.camera._reader_thread.is_alive())
+        self.assertLessEqual(self.camera.cap.retrieve.call_count, 3)  # Decoded on request only
+        self.assertGreaterEqual(self.camera.cap.grab.call_count, 1)
 
 class TestAIVision(unittest.TestCase):
     """Test AI vision analysis"""
     
+    _ALLOWED = frozenset({'move_forward', 'turn_left', 'turn_right', 'move_backward', 'stop'})
+    
     def setUp(self):
         """Setup test environment"""
-        from ai_vision import GeminiVisionAnalyzer
         self.analyzer = GeminiVisionAnalyzer()
     
+    def _attach_model(self, response_text):
+        """Attach a mock Gemini model returning response_text"""
+        self.analyzer.model = Mock()
+        self.analyzer.model.generate_content.return_value = Mock(text=response_text)
+        self.analyzer._model_call = self.analyzer.model.generate_content
+        self.analyzer.is_initialized = True
+    
     def test_analyzer_initialization(self):
         """Test analyzer initialization"""
         self.assertIsNotNone(self.analyzer)
         self.assertFalse(self.analyzer.is_initialized)
     
+    def test_sdk_not_imported(self):
+        """Test the analyzer is built and parses responses without the Gemini SDK"""
+        # A None entry makes any import of the SDK raise ImportError
+        with patch.dict(sys.modules, {'google.generativeai': None}):
+            analyzer = GeminiVisionAnalyzer()
+            decision = analyzer._parse_response("ACTION: stop REASON: Person detected in path")
+        self.assertEqual(decision.action, 'stop')
+    
     def test_response_parsing(self):
         """Test response parsing logic"""
-        test_responses = [
-            "ACTION: move_forward REASON: Path is clear ahead",
-            "ACTION: turn_left REASON: Obstacle detected on right",
-            "ACTION: stop REASON: Person detected in path",
-            "The robot should move forward because the path looks clear.",
-            "I recommend turning left to avoid the obstacle."
-        ]
-        
-        for response in test_responses:
-            result = self.analyzer._parse_response(response)
-            self.assertIsInstance(result, dict)
-            self.assertIn('action', result)
-            self.assertIn('reason', result)
-            self.assertIn('confidence', result)
-            self.assertIn(result['action'], ['move_forward', 'turn_left', 'turn_right', 'move_backward', 'stop'])
+        for response in _TEST_RESPONSES:
+            with self.subTest(response=response):
+                result = self.analyzer._parse_response(response)
+                self.assertTrue(
+                    isinstance(result, Decision) and result.reason
+                    and result.confidence >= 0.0 and result.action in self._ALLOWED,
+                    result
+                )
+
+    def test_token_bucket(self):
+        """Test token bucket burst and return logic"""
+        bucket = TokenBucket(capacity=2, refill_rate=0.0)
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())  # Burst exhausted
+
+        bucket.return_token()
+        self.assertTrue(bucket.try_acquire())
+
+    def test_analysis_cache(self):
+        """Test repeated scenes are served from the analysis cache"""
+        self._attach_model("ACTION: stop REASON: Person detected in path")
+
+        image = Image.new('RGB', (640, 480))
+        image.paste((255, 255, 255), (320, 0, 640, 480))
+        first = self.analyzer.analyze_image(image)
+        second = self.analyzer.analyze_image(image)
+
+        self.assertEqual(first.action, 'stop')
+        self.assertEqual(second.action, 'stop')
+        self.assertEqual(self.analyzer.model.generate_content.call_count, 1)
+        self.assertEqual(self.analyzer.cache_hits, 1)
+        self.assertEqual(self.analyzer.api_requests, 1)
+
+        # Frame is uploaded as a downscaled JPEG blob
+        blob = self.analyzer.model.generate_content.call_args[0][0][0]
+        self.assertEqual(blob['mime_type'], 'image/jpeg')
+        self.assertEqual(Image.open(io.BytesIO(blob['data'])).size, (512, 384))
+
+    def test_analysis_cache_limits(self):
+        """Test textureless frames are never cached and entries expire"""
+        self._attach_model("ACTION: move_forward REASON: Path is clear ahead")
+        
+        # Covered lens or plain wall, any decision must come from a new request
+        self.assertEqual(perceptual_hash(_TEST_FRAME), 0)
+        self.analyzer.analyze_image(_TEST_FRAME)
+        self.analyzer.analyze_image(_TEST_FRAME)
+        self.assertEqual(self.analyzer.api_requests, 2)
+        self.assertEqual(self.analyzer.cache_hits, 0)
+        
+        # Textured frame is cached until the entry is older than cache_ttl
+        self.analyzer.analyze_image(_TEST_FRAME, image_key=1)
+        self.analyzer.analyze_image(_TEST_FRAME, image_key=1)
+        self.assertEqual(self.analyzer.api_requests, 3)
+        self.analyzer.cache_ttl = 0.0
+        self.analyzer.analyze_image(_TEST_FRAME, image_key=1)
+        self.assertEqual(self.analyzer.api_requests, 4)
+    
+    def test_batch_analysis(self):
+        """Test several frames are analyzed with a single request"""
+        self._attach_model("FRAME 1: ACTION: turn_left REASON: Obstacle ahead\n"
+                           "FRAME 2: ACTION: stop REASON: Person detected in path")
+
+        # Camera frames (BGR arrays) go straight to the analyzer
+        self.analyzer.buffer_frame(np.full((480, 640, 3), 255, dtype=np.uint8))
+        self.analyzer.buffer_frame(_TEST_FRAME)
+        results = self.analyzer.analyze_buffered()
+
+        self.assertEqual([r.action for r in results], ['turn_left', 'stop'])
+        self.assertEqual(self.analyzer.model.generate_content.call_count, 1)
+        self.assertEqual(len(self.analyzer._frame_buffer), 0)
+
+        contents = self.analyzer.model.generate_content.call_args[0][0]
+        self.assertEqual(len(contents), 3)  # Two frames + prompt
+        self.assertTrue(contents[0]['data'].startswith(b'\xff\xd8'))  # JPEG magic
+
+    def test_batch_missing_frames(self):
+        """Test batch answers are matched to frames by number, not position"""
+        frames = [_TEST_FRAME] * 3
+        
+        # Middle frame skipped, the answers stay on frames 1 and 3
+        self._attach_model("FRAME 1: ACTION: turn_left REASON: Obstacle ahead\n"
+                           "FRAME 3: ACTION: stop REASON: Person detected in path")
+        results = self.analyzer.analyze_batch(frames, image_keys=[11, 12, 13])
+        self.assertEqual([r.action for r in results], ['turn_left', 'stop'])
+        self.assertEqual({key[0] for key in self.analyzer._cache}, {11, 13})
+        
+        # Newest frame unanswered, the batch fails and nothing lands on frame 3's key
+        self.analyzer._cache.clear()
+        self._attach_model("FRAME 1: ACTION: turn_left REASON: Obstacle ahead\n"
+                           "FRAME 2: ACTION: stop REASON: Person detected in path\n"
+                           "FRAME 7: ACTION: move_forward REASON: Path is clear ahead")
+        self.assertIsNone(self.analyzer.analyze_batch(frames, image_keys=[21, 22, 23]))
+        self.assertEqual({key[0] for key in self.analyzer._cache}, {21, 22})
+    
+    def test_jpeg_bytes_input(self):
+        """Test encoded JPEG frames are uploaded without re-encoding"""
+        self._attach_model("ACTION: move_forward REASON: Path is clear ahead")
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        frame[:, 320:] = 255
+        jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+        
+        self.assertEqual(perceptual_hash(jpeg), perceptual_hash(frame))
+        result = self.analyzer.analyze_image(jpeg)
+        
+        self.assertEqual(result.action, 'move_forward')
+        blob = self.analyzer.model.generate_content.call_args[0][0][0]
+        self.assertIs(blob['data'], jpeg)
+    
+    def test_circuit_breaker(self):
+        """Test requests are suspended after repeated API failures"""
+        self._attach_model("ACTION: stop REASON: Person detected in path")
+        self.analyzer.model.generate_content.side_effect = Exception("503 Service Unavailable")
+        frame = _TEST_FRAME
+
+        for key in range(self.analyzer._fail_threshold + 1):
+            self.assertIsNone(self.analyzer.analyze_image(frame, image_key=key))
+
+        # Last attempt was skipped without a request or a rate limit token
+        self.assertEqual(self.analyzer.model.generate_content.call_count,
+                         self.analyzer._fail_threshold)
+        self.assertEqual(self.analyzer.bucket.tokens, self.analyzer.bucket.capacity)
+        self.assertTrue(self.analyzer.is_circuit_open)
+
+        # Trial request after the cooldown closes the circuit again
+        self.analyzer.model.generate_content.side_effect = None
+        self.analyzer._open_until = time.monotonic()
+        self.assertEqual(self.analyzer.analyze_image(frame, image_key=-1).action, 'stop')
+        self.assertEqual(self.analyzer._fail_count, 0)
+        self.assertFalse(self.analyzer._open_until)
+        self.assertFalse(self.analyzer.is_circuit_open)
 
 class TestRobotControl(unittest.TestCase):
     """Test robot control functionality"""
     
     def setUp(self):
         """Setup test environment"""
-        from robot_control import RobotController
         self.controller = RobotController(simulation_mode=True)
     
     def test_controller_initialization(self):
@@ -106,25 +383,60 @@ class TestRobotControl(unittest.TestCase):
         
         # Test initial safety conditions
         conditions = self.controller.check_safety_conditions()
-        self.assertIsInstance(conditions, dict)
+        self.assertIsInstance(conditions, Mapping)
+        self.assertIs(self.controller.check_safety_conditions(), conditions)  # Same view
+        with self.assertRaises(TypeError):
+            conditions['not_emergency'] = True  # Read-only
         
         # Test emergency stop
         self.controller.set_emergency_stop(True)
         self.assertTrue(self.controller.emergency_stop)
+        self.controller.check_safety_conditions()
+        self.assertFalse(conditions['not_emergency'])  # Updated in place
         
         self.controller.set_emergency_stop(False)
         self.assertFalse(self.controller.emergency_stop)
+        
+        self.controller.update_state()
+        self.assertTrue(self.controller.is_safe_to_move())
+        self.assertTrue(all(self.controller.check_safety_conditions().values()))
+    
+    def test_robot_state(self):
+        """Test state components are views of one buffer"""
+        self.controller.initialize()
+        state = self.controller.robot_state
+        
+        state.orientation = (0.0, 0.6, 0.0)  # Pitched too far
+        self.assertAlmostEqual(float(state.state[4]), 0.6, places=5)
+        self.assertTrue(state.velocity.base is state.state)
+        
+        self.controller.update_state()
+        self.assertFalse(self.controller.check_safety_conditions()['orientation_ok'])
     
     def test_movement_commands(self):
         """Test movement command execution"""
         self.controller.initialize()
         
         # Test basic movement commands
-        commands = ['move_forward', 'turn_left', 'turn_right', 'stop']
+        for cmd in _TEST_COMMANDS:
+            with self.subTest(cmd=cmd):
+                self.assertTrue(self.controller.execute_ai_command(cmd))
+    
+    def test_command_writer(self):
+        """Test commands are written by the writer thread, latest first"""
+        self.controller.cmd_writer = Mock()
+        self.controller.low_cmd = Mock()
+        self.controller._write_command = Mock()
+        self.controller._start_writer()
         
-        for cmd in commands:
-            success = self.controller.execute_ai_command(cmd)
-            self.assertTrue(success)
+        for speed in (0.1, 0.2, 0.3):
+            self.controller._post_command(np.array([speed, 0.0, 0.0], dtype=np.float32))
+        self.controller._stop_writer()
+        
+        self.assertIsNone(self.controller._writer_thread)
+        self.assertFalse(self.controller._cmd_pending)
+        written = self.controller._write_command.call_args[0][0]
+        self.assertAlmostEqual(float(written[0]), 0.3, places=5)
     
     def test_velocity_limits(self):
         """Test velocity limiting"""
@@ -133,14 +445,26 @@ class TestRobotControl(unittest.TestCase):
         # Test exceeding limits
         success = self.controller.velocity_move(1.0, 0.5, 1.0)  # Exceed all limits
         self.assertTrue(success)  # Should succeed but with limited values
+        
+        self.assertEqual(self.controller._cmd_buf.tolist(), MAX_SPEEDS.tolist())
+        
+        # Preset commands are clamped without being modified
+        forward = MOVEMENT_COMMANDS['move_forward'].copy()
+        self.assertTrue(self.controller.execute_ai_command('move_forward'))
+        self.assertEqual(MOVEMENT_COMMANDS['move_forward'].tolist(), forward.tolist())
 
 class TestAutonomousMode(unittest.TestCase):
     """Test autonomous mode integration"""
     
-    def setUp(self):
-        """Setup test environment"""
-        from autonomous_mode import AutonomousRobot
-        self.robot = AutonomousRobot(simulation_mode=True)
+    @classmethod
+    def setUpClass(cls):
+        """Setup test environment once, the tests only read robot state"""
+        cls.robot = AutonomousRobot(simulation_mode=True)
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Release the shared robot's log handlers and log file"""
+        cls.robot._close_logging()
     
     def test_robot_initialization(self):
         """Test autonomous robot initialization"""
@@ -150,12 +474,236 @@ class TestAutonomousMode(unittest.TestCase):
     
     def test_statistics_tracking(self):
         """Test statistics tracking"""
-        stats = self.robot.statistics
-        self.assertIsInstance(stats, dict)
-        self.assertIn('total_frames', stats)
-        self.assertIn('ai_queries', stats)
-        self.assertIn('movement_commands', stats)
+        # Snapshot, the robot is shared by every test in the class
+        stats = asdict(self.robot.statistics)
+        for counter in ('total_frames', 'ai_queries', 'movement_commands'):
+            self.assertIn(counter, stats)
+            self.assertGreaterEqual(stats[counter], 0)
+    
+    def test_retry_waits_not_skipped(self):
+        """Test safety and error retry waits are not counted as skipped ticks"""
+        robot = AutonomousRobot(simulation_mode=True)
+        self.addCleanup(robot._close_logging)
+        robot.robot_control = Mock()
+        robot.robot_control.is_safe_to_move.side_effect = [False, True, True]
+        robot._log_status = Mock()
+        
+        # Fake clock, the stop event's waits advance it instead of sleeping
+        clock = [0]
+        stop = threading.Event()
+        def wait(timeout):
+            clock[0] += int(timeout * 1e9)
+            return stop.is_set()
+        robot._stop_evt = Mock(is_set=stop.is_set, wait=wait)
+        
+        # First pass hits the safety stop, the second fails, the third ends the loop
+        def capture():
+            if robot.robot_control.is_safe_to_move.call_count == 2:
+                raise RuntimeError("camera error")
+            stop.set()
+        robot.capture_and_analyze = Mock(side_effect=capture)
+        
+        with patch('time.monotonic_ns', side_effect=lambda: clock[0]):
+            robot.autonomous_loop()
+        
+        self.assertEqual(robot.statistics.safety_stops, 1)
+        self.assertEqual(robot.capture_and_analyze.call_count, 2)
+        self.assertEqual(robot.statistics.skipped_ticks, 0)
+
+class TestCaptureAndAnalyze(unittest.TestCase):
+    """Test background AI requests in the capture and analyze step"""
+    
+    def setUp(self):
+        """Setup a robot with a mocked camera and batch analysis"""
+        self.robot = AutonomousRobot(simulation_mode=True)
+        self.frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        self.frame[:, 320:] = 255
+        self.robot.camera = Mock()
+        self.robot.camera.grab_frame.return_value = True
+        self.robot.camera.retrieve_frame.return_value = self.frame
+        
+        # Requests stay in flight until the test releases them
+        self.release = threading.Event()
+        self.results = [Decision('turn_left', 'Obstacle ahead', '', 0.8, time.time())]
+        self.robot.ai_vision.analyze_batch = Mock(
+            side_effect=lambda *args: self.results if self.release.wait(1.0) else None
+        )
+    
+    def tearDown(self):
+        """Stop the AI worker and release the robot's log handlers"""
+        self.release.set()
+        self.robot._ai_pool.shutdown(wait=True)
+        self.robot._close_logging()
+    
+    def _finish_pending(self):
+        """Let the in-flight AI request finish and pick up its result"""
+        self.release.set()
+        self.robot._pending.exception(timeout=1.0)  # Waits without raising
+        self.release.clear()
+        return self.robot.capture_and_analyze()
+    
+    def test_pending_result(self):
+        """Test AI results are picked up on a later tick without blocking"""
+        self.assertIsNone(self.robot.capture_and_analyze())  # Request in flight
+        self.assertIsNotNone(self.robot._pending)
+        self.robot.ai_vision.analyze_batch.assert_called_once()
+        
+        self.robot.ai_vision.api_requests = 1  # Sent by the mocked batch request
+        decision = self._finish_pending()
+        self.assertEqual(decision.action, 'turn_left')
+        self.assertIsNone(self.robot._pending)
+        self.assertIs(self.robot.last_decision, decision)
+        self.assertEqual(self.robot.statistics.ai_queries, 1)
+    
+    def test_pending_timeout(self):
+        """Test a stuck AI request is abandoned and the last decision reused"""
+        previous = Decision('stop', 'Person detected', '', 0.9, time.time())
+        self.robot.last_decision = previous
+        self.robot._ai_timeout_ns = 0
+        
+        self.assertIs(self.robot.capture_and_analyze(), previous)
+        self.assertIs(self.robot.capture_and_analyze(), previous)  # Timed out
+        self.assertIsNone(self.robot._pending)
+    
+    def test_failed_analysis(self):
+        """Test a failed or rate limited analysis keeps the last decision"""
+        self.results = None
+        previous = Decision('stop', 'Person detected', '', 0.9, time.time())
+        self.robot.last_decision = previous
+        
+        self.robot.capture_and_analyze()
+        self.assertIs(self._finish_pending(), previous)
+        self.assertIsNone(self.robot._pending)
+    
+    def test_analysis_exception(self):
+        """Test an analysis that raises is dropped and the next query still runs"""
+        previous = Decision('stop', 'Person detected', '', 0.9, time.time())
+        self.robot.last_decision = previous
+        analyze = self.robot.ai_vision.analyze_batch.side_effect
+        def fail_once(*args):
+            if self.robot.ai_vision.analyze_batch.call_count == 1:
+                self.release.wait(1.0)
+                raise ValueError("JPEG encoding failed")
+            return analyze(*args)
+        self.robot.ai_vision.analyze_batch.side_effect = fail_once
+        
+        self.robot.capture_and_analyze()
+        self.assertIs(self._finish_pending(), previous)
+        self.assertIsNone(self.robot._pending)
+        self.assertIs(self.robot.capture_and_analyze(), previous)  # Not raised again
+        
+        self.robot._last_ai_query_ns -= self.robot._ai_query_interval_ns
+        self.robot.capture_and_analyze()
+        self.assertEqual(self._finish_pending().action, 'turn_left')
+        self.assertEqual(self.robot.ai_vision.analyze_batch.call_count, 2)
+    
+    def test_circuit_open_stops(self):
+        """Test an open circuit drops the last decision so the loop stops the robot"""
+        self.results = None
+        self.robot.last_decision = Decision('move_forward', 'Path is clear', '', 0.9, time.time())
+        self.robot.ai_vision._open_until = time.monotonic() + 60.0  # Gemini outage
+        
+        self.assertIsNone(self.robot.capture_and_analyze())
+        self.assertIsNone(self._finish_pending())
+        self.assertIsNone(self.robot.last_decision)
+        
+        # A completed request closes the circuit and its decision drives the robot
+        self.results = [Decision('turn_left', 'Obstacle ahead', '', 0.8, time.time())]
+        self.robot.ai_vision._record_success()
+        self.robot._last_ai_query_ns -= self.robot._ai_query_interval_ns
+        self.robot.capture_and_analyze()
+        self.assertEqual(self._finish_pending().action, 'turn_left')
+    
+    def test_frame_not_ready(self):
+        """Test a missing frame skips the sample instead of waiting or stopping"""
+        self.robot.camera.retrieve_frame.return_value = None
+        previous = Decision('stop', 'Person detected', '', 0.9, time.time())
+        self.robot.last_decision = previous
+        
+        self.assertIs(self.robot.capture_and_analyze(), previous)
+        self.assertIsNone(self.robot._pending)  # Nothing to analyze yet
+        
+        # Frame is requested one tick before the next sample is due
+        self.robot.camera.retrieve_frame.return_value = self.frame
+        self.robot.capture_and_analyze()
+        self.assertIsNotNone(self.robot._pending)
+        sample_interval_ns = self.robot._ai_query_interval_ns // AI_BATCH_SIZE
+        self.robot._last_frame_sample_ns = (time.monotonic_ns() - sample_interval_ns
+                                            + self.robot._loop_interval_ns // 2)
+        self.robot.camera.retrieve_frame.reset_mock()
+        self.robot.capture_and_analyze()
+        self.robot.camera.request_frame.assert_called_once()
+        self.robot.camera.retrieve_frame.assert_not_called()
+    
+    def test_query_interval_backoff(self):
+        """Test static scenes stretch the query interval and changes reset it"""
+        base = self.robot._base_ai_query_interval_ns
+        
+        def query_now():
+            self.robot._last_ai_query_ns -= self.robot._ai_query_interval_ns
+            self.robot.capture_and_analyze()
+            self._finish_pending()
+        
+        query_now()  # First query, scene counts as changed
+        self.assertEqual(self.robot._ai_query_interval_ns, base)
+        query_now()
+        self.assertEqual(self.robot._ai_query_interval_ns, 2 * base)
+        for _ in range(3):
+            query_now()
+        self.assertEqual(self.robot._ai_query_interval_ns, self.robot._max_ai_query_interval_ns)
+        
+        self.robot.camera.retrieve_frame.return_value = np.ascontiguousarray(self.frame[:, ::-1])
+        query_now()  # Scene changed
+        self.assertEqual(self.robot._ai_query_interval_ns, base)
+    
+    def test_restart_after_shutdown(self):
+        """Test AI requests can be scheduled again after a shutdown"""
+        self.robot.running = True
+        with patch('time.sleep'):
+            self.robot.shutdown()
+        
+        self.assertIsNone(self.robot.capture_and_analyze())
+        self.assertEqual(self._finish_pending().action, 'turn_left')
+
+# Microbenchmarks for the per-frame hot paths, collected by pytest only. With
+# pytest-benchmark installed they can gate regressions, e.g.
+#   pytest run_tests.py -k bench --benchmark-min-rounds=100 --benchmark-warmup=on \
+#       --benchmark-autosave --benchmark-compare --benchmark-compare-fail=median:10%
+# Without it they are skipped.
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+if pytest is not None:
+    try:
+        import pytest_benchmark  # noqa: F401 - provides the benchmark fixture
+    except ImportError:
+        @pytest.fixture
+        def benchmark():
+            """Skip benchmarks when pytest-benchmark is not installed"""
+            pytest.skip("pytest-benchmark not installed")
+    
+    def test_bench_frame_to_base64(benchmark):
+        """Benchmark frame downscale, JPEG and base64 encoding"""
+        camera = CameraCapture()
+        assert benchmark(camera.frame_to_base64, _TEST_FRAME)
+    
+    def test_bench_frame_to_pil(benchmark):
+        """Benchmark BGR frame to PIL image conversion"""
+        camera = CameraCapture()
+        assert benchmark(camera.frame_to_pil, _TEST_FRAME) is not None
+    
+    def test_bench_parse_response(benchmark):
+        """Benchmark parsing structured and free-text model replies"""
+        analyzer = GeminiVisionAnalyzer()
+        results = benchmark(lambda: [analyzer._parse_response(r) for r in _TEST_RESPONSES])
+        assert len(results) == len(_TEST_RESPONSES)
 
+# The component and integration checks below stay plain functions that main()
+# runs, not pytest tests: they open the real camera, call the Gemini API with the
+# configured key and drive the robot in real time, so collecting them would tie
+# every pytest/xdist run to hardware and network access and spend API quota
 def run_component_tests():
     """Run individual component tests"""
     print("\n=== Component Tests ===")
@@ -187,13 +735,15 @@ def run_component_tests():
     except Exception as e:
         print(f"✗ Robot control module test failed: {e}")
 
+# Integration test covers 5 s of the control loop at 10 Hz
+SIM_DT = 0.1
+SIM_STEPS = int(5.0 / SIM_DT)
+
 def run_integration_test():
     """Run integration test"""
     print("\n=== Integration Test ===")
     
     try:
-        from autonomous_mode import AutonomousRobot
-        
         # Create robot in simulation mode
         robot = AutonomousRobot(simulation_mode=True)
         
@@ -205,47 +755,64 @@ def run_integration_test():
             print("✗ System initialization failed")
             return False
         
-        # Test short autonomous run (5 seconds)
-        print("Running 5-second autonomous test...")
+        # Simulation has no hardware to wait for, so steps run back to back
+        # and the test is bound by update_state/execute_decision, not the clock
+        sleep = (lambda _: None) if robot.simulation_mode else time.sleep
+        print(f"Running {SIM_STEPS}-step autonomous test...")
         robot.running = True
         
-        start_time = time.time()
+        test_decision = {
+            'action': 'move_forward',
+            'reason': 'Test movement',
+            'confidence': 0.8
+        }
         iterations = 0
         
-        while robot.running and (time.time() - start_time) < 5.0:
+        start_time = time.perf_counter()
+        for _ in range(SIM_STEPS):
+            if not robot.running:
+                break
+            
             # Simulate one loop iteration
             robot.robot_control.update_state()
-            
-            # Test decision execution with mock decision
-            test_decision = {
-                'action': 'move_forward',
-                'reason': 'Test movement',
-                'confidence': 0.8
-            }
-            
             robot.execute_decision(test_decision)
             iterations += 1
-            time.sleep(0.1)
+            sleep(SIM_DT)
+        elapsed = time.perf_counter() - start_time
         
         # Stop robot
-        robot.stop()
+        robot.shutdown()
         
-        print(f"✓ Integration test completed - {iterations} iterations")
+        print(f"✓ Integration test completed - {iterations} iterations "
+              f"({iterations / elapsed:.0f} iterations/s)")
         return True
         
     except Exception as e:
         print(f"✗ Integration test failed: {e}")
         return False
 
-def main():
-    """Main test runner"""
-    print("=== Unitree G1 Autonomous Mode - Test Suite ===")
+def run_unit_tests():
+    """
+    Run the unit tests, spread across CPU cores with pytest-xdist when
+    it is installed, otherwise serially with unittest
     
-    # Setup logging
-    logging.basicConfig(level=logging.INFO)
+    Returns:
+        tuple: (success, summary line)
+    """
+    try:
+        import pytest
+        import xdist  # noqa: F401 - only checking the plugin is installed
+    except ImportError:
+        pytest = None
     
-    # Run unit tests
-    print("\n=== Unit Tests ===")
+    if pytest is not None:
+        exit_code = pytest.main(["-n", "auto", "-q", "--tb=short", "-p", "no:cacheprovider", __file__])
+        return exit_code == 0, f"pytest-xdist exit code {int(exit_code)}"
+    
+    # One serial suite on purpose. Runner threads per test class measured slower
+    # (0.12-0.18 s against 0.07 s for the CPU-bound, sub-millisecond tests), and
+    # patch.dict(sys.modules) and the runners' warning filters are process-global,
+    # so concurrent classes would race on them
     loader = unittest.TestLoader()
     suite = unittest.TestSuite()
     
@@ -254,10 +821,25 @@ def main():
     suite.addTests(loader.loadTestsFromTestCase(TestAIVision))
     suite.addTests(loader.loadTestsFromTestCase(TestRobotControl))
     suite.addTests(loader.loadTestsFromTestCase(TestAutonomousMode))
+    suite.addTests(loader.loadTestsFromTestCase(TestCaptureAndAnalyze))
     
-    # Run tests
-    runner = unittest.TextTestRunner(verbosity=2)
+    # Run tests, dots plus failure details; the summary line gives the totals.
+    # Output printed by a test is captured and only shown if it fails
+    runner = unittest.TextTestRunner(verbosity=1, buffer=True)
     result = runner.run(suite)
+    summary = f"{result.testsRun} run, {len(result.failures)} failures, {len(result.errors)} errors"
+    return result.wasSuccessful(), summary
+
+def main():
+    """Main test runner"""
+    print("=== Unitree G1 Autonomous Mode - Test Suite ===")
+    
+    # Setup logging
+    logging.basicConfig(level=logging.INFO)
+    
+    # Run unit tests
+    print("\n=== Unit Tests ===")
+    unit_success, unit_summary = run_unit_tests()
     
     # Run component tests
     run_component_tests()
@@ -267,10 +849,10 @@ def main():
     
     # Summary
     print("\n=== Test Summary ===")
-    print(f"Unit Tests: {result.testsRun} run, {len(result.failures)} failures, {len(result.errors)} errors")
+    print(f"Unit Tests: {unit_summary}")
     print(f"Integration Test: {'✓ Passed' if integration_success else '✗ Failed'}")
     
-    if result.wasSuccessful() and integration_success:
+    if unit_success and integration_success:
         print("✓ All tests passed!")
         return 0
     else: